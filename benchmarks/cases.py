@@ -0,0 +1,119 @@
+"""Benchmark cases for the token, hashing, auth and route hot paths."""
+import hashlib, itertools, json
+from project import config, db, hasher, principals, rate_limiter, verified_tokens
+from project.api.models import RefreshToken, User
+from project.api.passwords import BcryptScheme, ScryptScheme
+from project.api.serialization import ENCODERS
+from project.api.queries import PUBLIC_USER_FIELDS, get_user_public, list_users
+from project.api.users import serialize_user
+from project.api.utils import authenticate
+from benchmarks.runner import Suite
+
+CONFIG_CLASSES = (config.DevelopmentConfig, config.TestingConfig, config.ProductionConfig)
+
+def configured_schemes():
+    """One scheme per distinct cost set on any config class."""
+    schemes = [BcryptScheme(rounds) for rounds in sorted({c.BCRYPT_LOG_ROUNDS for c in CONFIG_CLASSES})]
+    if hasattr(hashlib, 'scrypt'):
+        schemes += [ScryptScheme(log_n, r, p)
+                    for log_n, r, p in sorted({(c.SCRYPT_LOG_N, c.SCRYPT_R, c.SCRYPT_P) for c in CONFIG_CLASSES})]
+    return schemes
+
+def scheme_label(scheme):
+    if isinstance(scheme, BcryptScheme):
+        return f'bcrypt.{scheme.rounds}'
+    return f'scrypt.ln{scheme.log_n}.r{scheme.r}.p{scheme.p}'
+
+def build_suite(app, admin_id):
+    suite = Suite()
+    client = app.test_client()
+    token = User.encode_auth_token(admin_id)
+    headers = dict(Authorization='Bearer ' + token.decode())
+    counter = itertools.count()
+
+    suite.case('token.encode', lambda: User.encode_auth_token(admin_id))
+    suite.case('token.decode', lambda: User.decode_auth_token(token), setup=verified_tokens.clear)
+    suite.case('token.decode.cached', lambda: User.decode_auth_token(token))
+
+    for scheme in configured_schemes():
+        pw_hash = scheme.hash('password123')
+        label = scheme_label(scheme)
+        suite.case(f'password.hash.{label}', lambda scheme=scheme: scheme.hash('password123'), repeat=3)
+        suite.case(f'password.verify.{label}',
+                   lambda scheme=scheme, pw_hash=pw_hash: scheme.verify(pw_hash, 'password123'), repeat=3)
+    suite.case('password.hash.pooled', lambda: hasher.hash_password('password123'))
+
+    page_size = app.config['USERS_PAGE_MAX_LIMIT']
+    page = {'status': 'success', 'data': {'users': [serialize_user(row) for row in list_users(limit=page_size)]}}
+    for name, dumps in sorted(ENCODERS.items()):
+        suite.case(f'serialize.users.{page_size}.{name}', lambda dumps=dumps: dumps(page))
+
+    # The ORM cases start from an empty identity map, as a request would.
+    def orm_page():
+        users = User.query.order_by(User.created_at.desc(), User.id.desc()).limit(page_size)
+        return [{field: getattr(user, field) for field in PUBLIC_USER_FIELDS} for user in users]
+    suite.case(f'query.users.{page_size}.orm', orm_page, setup=db.session.expunge_all)
+    suite.case(f'query.users.{page_size}.core', lambda: list_users(limit=page_size))
+    suite.case('query.user.orm', lambda: User.query.filter_by(id=admin_id).first(), setup=db.session.expunge_all)
+    suite.case('query.user.core', lambda: get_user_public(admin_id))
+
+    suite.case('ratelimit.hit', lambda: rate_limiter.hit(f'bench:{next(counter) % 1000}', 10 ** 9))
+
+    view = authenticate(lambda principal: principal)
+    def call_view():
+        with app.test_request_context(headers=headers):
+            view()
+    suite.case('authenticate.cached', call_view)
+    def clear_caches():
+        principals.clear()
+        verified_tokens.clear()
+    suite.case('authenticate.uncached', call_view, setup=clear_caches)
+
+    def json_body(payload):
+        return dict(data=json.dumps(payload), content_type='application/json')
+    def fresh_token():
+        # Logging out or revoking a token denylists it; use a new one each time.
+        return User.encode_auth_token(admin_id).decode()
+    refresh_token = [RefreshToken.issue(admin_id)]
+    db.session.commit()
+    def rotate():
+        # Each refresh spends the token and hands back its successor.
+        response = client.post('/auth/refresh', **json_body(dict(refresh_token=refresh_token[0])))
+        refresh_token[0] = json.loads(response.data.decode())['refresh_token']
+    def new_user():
+        n = next(counter)
+        return dict(username=f'bench{n}', email=f'bench{n}@example.com', password='password123')
+
+    routes = [
+        ('POST', '/auth/register', lambda: client.post('/auth/register', **json_body(new_user()))),
+        ('POST', '/auth/login', lambda: client.post('/auth/login', **json_body(
+            dict(email='bench_admin@example.com', password='password123')))),
+        ('GET', '/auth/logout', lambda: client.get(
+            '/auth/logout', headers=dict(Authorization='Bearer ' + fresh_token()))),
+        ('POST', '/auth/revoke', lambda: client.post(
+            '/auth/revoke', headers=headers, **json_body(dict(token=fresh_token())))),
+        ('POST', '/auth/refresh', rotate),
+        ('POST', '/auth/introspect', lambda: client.post(
+            '/auth/introspect', **json_body(dict(tokens=[token.decode()] * 10)))),
+        ('GET', '/auth/jwks', lambda: client.get('/auth/jwks')),
+        ('GET', '/auth/status', lambda: client.get('/auth/status', headers=headers)),
+        ('POST', '/users', lambda: client.post('/users', headers=headers, **json_body(new_user()))),
+        ('POST', '/users/bulk', lambda: client.post('/users/bulk', headers=headers, **json_body(new_user()))),
+        ('GET', '/users/<user_id>', lambda: client.get(f'/users/{admin_id}')),
+        ('GET', '/users', lambda: client.get('/users')),
+        ('GET', '/users?limit=max', lambda: client.get(f'/users?limit={page_size}')),
+        ('GET', '/users?limit=max gzip', lambda: client.get(
+            f'/users?limit={page_size}', headers={'Accept-Encoding': 'gzip'})),
+        ('GET', '/users?ids', lambda: client.get('/users?ids=' + ','.join(map(str, range(1, 51))))),
+        ('GET', '/users/search', lambda: client.get('/users/search?q=user12', headers=headers)),
+        ('GET', '/users/search fuzzy', lambda: client.get('/users/search?q=er12&fuzzy=1', headers=headers)),
+        ('GET', '/users/export', lambda: client.get('/users/export', headers=headers).data),
+    ]
+    for method, rule, request in routes:
+        suite.case(f'route.{method} {rule}', request)
+    suite.uncovered = sorted(
+        f'{method} {rule.rule}' for rule in app.url_map.iter_rules()
+        for method in rule.methods - {'HEAD', 'OPTIONS'}
+        if rule.endpoint != 'static' and (method, rule.rule) not in {(m, r) for m, r, _ in routes}
+    )
+    return suite
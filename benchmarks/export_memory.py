@@ -0,0 +1,71 @@
+"""Peak RSS of GET /users/export as the users table grows.
+
+Seeds a throwaway SQLite database (or DATABASE_URL, when given) with N users
+and streams the export in a fresh process, so each size is measured from
+the same baseline:
+
+    python -m benchmarks.export_memory --sizes 10000,100000,1000000
+
+Prints one JSON object per size. rss_growth_kb should stay roughly flat as
+rows grows if the export is really streaming.
+"""
+import argparse, json, os, resource, subprocess, sys, tempfile, time
+from benchmarks.fixtures import create_bench_app, seed_users
+
+def seed(database_url, rows):
+    app = create_bench_app(database_url)
+    with app.app_context():
+        seed_users(rows)
+
+def measure(database_url, export_format):
+    app = create_bench_app(database_url)
+    from project.api.models import User
+    with app.app_context():
+        admin = User.query.filter_by(username='bench_admin').first()
+        headers = dict(Authorization='Bearer ' + admin.encode_auth_token(admin.id).decode())
+    client = app.test_client()
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    response = client.get(f'/users/export?format={export_format}', headers=headers, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return {
+        'format': export_format,
+        'seconds': round(time.perf_counter() - started, 3),
+        'bytes': size,
+        'baseline_rss_kb': baseline_kb,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'rss_growth_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_kb,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--format', default='ndjson', choices=('ndjson', 'csv'))
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    parser.add_argument('--seed', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.seed is not None:
+        seed(args.database_url, args.seed)
+        return
+    if args.measure:
+        print(json.dumps(measure(args.database_url, args.format)))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or 'sqlite:///' + os.path.join(tmp, 'export.db')
+        for rows in [int(size) for size in args.sizes.split(',')]:
+            subprocess.check_call([
+                sys.executable, '-m', 'benchmarks.export_memory', '--seed', str(rows),
+                '--database-url', database_url
+            ])
+            output = subprocess.check_output([
+                sys.executable, '-m', 'benchmarks.export_memory', '--measure',
+                '--format', args.format, '--database-url', database_url
+            ])
+            result = json.loads(output.decode().strip().splitlines()[-1])
+            result['rows'] = rows
+            print(json.dumps(result))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Throwaway app and database setup shared by the benchmarks."""
+import datetime, os
+
+def create_bench_app(database_url, config='project.config.DevelopmentConfig'):
+    """Returns an app bound to database_url, never the configured database."""
+    os.environ['APP_SETTINGS'] = config
+    from project import create_app
+    app = create_app()
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['DEBUG'] = False
+    # Repeated logins from one client would otherwise time the 429 path;
+    # the limiter itself is timed by the ratelimit.hit case.
+    app.config['RATE_LIMIT_ENABLED'] = False
+    if not app.config.get('SECRET_KEY'):
+        app.config['SECRET_KEY'] = 'benchmark'
+    return app
+
+def seed_users(count, batch_size=10000):
+    """Recreates the schema with an admin plus count users and returns the
+    admin. Must run inside an app context."""
+    from project import db
+    from project.api.models import User
+    db.drop_all()
+    db.create_all()
+    admin = User(username='bench_admin', email='bench_admin@example.com', password='password123')
+    admin.admin = True
+    db.session.add(admin)
+    db.session.commit()
+    # Every seeded user shares the admin's hash so seeding does not pay for
+    # count bcrypt rounds.
+    now = datetime.datetime.utcnow()
+    insert = User.__table__.insert()
+    for start in range(0, count, batch_size):
+        db.session.execute(insert, [
+            dict(username=f'user{i}', email=f'user{i}@example.com', password=admin.password,
+                 created_at=now - datetime.timedelta(seconds=i))
+            for i in range(start, min(count, start + batch_size))
+        ])
+        db.session.commit()
+    return admin
@@ -0,0 +1,72 @@
+"""Time and memory of reading every user through the ORM versus the Core
+read model in project.api.queries.
+
+Seeds a throwaway SQLite database (or DATABASE_URL, when given) with N users
+and reads them all back in a fresh process per path, so each path is
+measured from the same baseline:
+
+    python -m benchmarks.read_model --rows 100000
+
+Prints one JSON object per path. peak_alloc_kb is the tracemalloc peak while
+the rows are read and turned into public-field dicts.
+"""
+import argparse, json, os, subprocess, sys, tempfile, time, tracemalloc
+from benchmarks.fixtures import create_bench_app, seed_users
+
+PATHS = ('orm', 'core')
+
+def seed(database_url, rows):
+    app = create_bench_app(database_url)
+    with app.app_context():
+        seed_users(rows)
+
+def read_orm():
+    from project.api.models import User
+    from project.api.queries import PUBLIC_USER_FIELDS
+    users = User.query.order_by(User.created_at.desc(), User.id.desc()).all()
+    return [{field: getattr(user, field) for field in PUBLIC_USER_FIELDS} for user in users]
+
+def read_core():
+    from project.api.queries import PUBLIC_USER_FIELDS, list_users
+    return [{field: row[field] for field in PUBLIC_USER_FIELDS} for row in list_users()]
+
+def measure(database_url, path):
+    app = create_bench_app(database_url)
+    read = {'orm': read_orm, 'core': read_core}[path]
+    with app.app_context():
+        tracemalloc.start()
+        started = time.perf_counter()
+        rows = read()
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {'path': path, 'rows': len(rows), 'seconds': round(seconds, 3), 'peak_alloc_kb': peak // 1024}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    parser.add_argument('--seed', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--measure', choices=PATHS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.seed is not None:
+        seed(args.database_url, args.seed)
+        return
+    if args.measure:
+        print(json.dumps(measure(args.database_url, args.measure)))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or 'sqlite:///' + os.path.join(tmp, 'read_model.db')
+        subprocess.check_call([
+            sys.executable, '-m', 'benchmarks.read_model', '--seed', str(args.rows),
+            '--database-url', database_url
+        ])
+        for path in PATHS:
+            output = subprocess.check_output([
+                sys.executable, '-m', 'benchmarks.read_model', '--measure', path,
+                '--database-url', database_url
+            ])
+            print(output.decode().strip().splitlines()[-1])
+
+if __name__ == '__main__':
+    main()
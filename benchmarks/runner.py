@@ -0,0 +1,67 @@
+"""Micro-benchmark runner: timing, JSON results and regression checks."""
+import datetime, json, platform, statistics, time
+
+class Suite:
+    """An ordered collection of named benchmark cases."""
+    def __init__(self):
+        self.cases = []
+
+    def case(self, name, fn, setup=None, repeat=None):
+        """Registers fn under name; setup, if given, runs untimed before each call."""
+        self.cases.append((name, fn, setup, repeat))
+
+    def run(self, repeat=20, only=None, report=print):
+        results = {}
+        for name, fn, setup, case_repeat in self.cases:
+            if only and not any(part in name for part in only):
+                continue
+            results[name] = measure(fn, setup, case_repeat or repeat)
+            report(format_result(name, results[name]))
+        return results
+
+def measure(fn, setup=None, repeat=20):
+    if setup:
+        setup()
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'repeat': repeat,
+        'min': timings[0],
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+    }
+
+def format_result(name, result):
+    return f"{name:<40} median {result['median'] * 1e3:10.3f} ms   p95 {result['p95'] * 1e3:10.3f} ms"
+
+def write_results(path, results, **meta):
+    meta.update(
+        python=platform.python_version(),
+        timestamp=datetime.datetime.utcnow().isoformat()
+    )
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+def compare(results, baseline, threshold=0.2):
+    """Returns (name, baseline median, current median, ratio) for every case
+    whose median got slower than baseline by more than threshold."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result['median'] / baseline[name]['median']
+        if ratio > 1 + threshold:
+            regressions.append((name, baseline[name]['median'], result['median'], ratio))
+    return regressions
@@ -1,7 +1,9 @@
-import unittest, coverage
+import datetime, os, unittest, coverage
+from concurrent.futures import ProcessPoolExecutor
 from flask_script import Manager
 from project import create_app,db
-from project.api.models import User
+from project.api.models import RefreshToken, User
+from project.api import bulk
 from flask_migrate import MigrateCommand
 
 COV = coverage.coverage(
@@ -39,6 +41,78 @@ def seed_db():
     db.session.add(User(username='juneau', email='juneau@mailinator.com', password='password123'))
     db.session.commit()
 
+@manager.command
+def prune_tokens():
+    """Deletes expired refresh tokens."""
+    expired = RefreshToken.query.filter(RefreshToken.expires_at < datetime.datetime.utcnow())
+    deleted = expired.delete(synchronize_session=False)
+    db.session.commit()
+    print(f'{deleted} expired refresh tokens deleted.')
+
+@manager.option('kid', help='key id; the key is written to JWT_KEY_DIR/<kid>.pem')
+def generate_key(kid):
+    """Generates an RSA signing key for RS256 tokens."""
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    path = os.path.join(app.config['JWT_KEY_DIR'], kid + '.pem')
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    print(f'Wrote {path}. Set JWT_SIGNING_KID={kid} to sign with it.')
+
+@manager.option('path', help='JSON lines or CSV file of username, email, password')
+@manager.option('-f', '--format', dest='fmt', default=None, help='jsonl or csv; guessed from the extension')
+@manager.option('-b', '--batch-size', dest='batch_size', type=int, default=None)
+def import_users(path, fmt=None, batch_size=None):
+    """Bulk imports users from a file."""
+    fmt = fmt or ('csv' if path.endswith('.csv') else 'jsonl')
+    created = failed = 0
+    processes = app.config['BULK_IMPORT_PROCESSES'] or os.cpu_count() or 1
+    with open(path, newline='') as f, ProcessPoolExecutor(max_workers=processes) as executor:
+        for result in bulk.import_users(bulk.iter_rows(f, fmt), batch_size=batch_size, executor=executor):
+            if result['status'] == 'created':
+                created += 1
+            else:
+                failed += 1
+                print(f"row {result['row']}: {result['status']} ({result['message']})")
+    print(f'{created} users created, {failed} rows failed.')
+
+@manager.option('-u', '--users', dest='users', type=int, default=1000, help='number of users to seed')
+@manager.option('-r', '--repeat', dest='repeat', type=int, default=20)
+@manager.option('-k', '--only', dest='only', default=None, help='comma separated substrings of case names')
+@manager.option('-d', '--database-url', dest='database_url', default=None,
+                help='defaults to a temporary SQLite file; never the configured database')
+@manager.option('-o', '--output', dest='output', default=None, help='write results as JSON')
+@manager.option('-b', '--baseline', dest='baseline', default=None, help='JSON results to compare against')
+@manager.option('-t', '--threshold', dest='threshold', type=float, default=0.2,
+                help='allowed slowdown of a median versus the baseline')
+def bench(users, repeat, only, database_url, output, baseline, threshold):
+    """Runs the micro-benchmarks against a throwaway database."""
+    import tempfile
+    COV.stop()  # tracing would dominate the timings
+    from benchmarks import cases, fixtures, runner
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = database_url or 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        bench_app = fixtures.create_bench_app(database_url)
+        with bench_app.app_context():
+            admin = fixtures.seed_users(users)
+            suite = cases.build_suite(bench_app, admin.id)
+            results = suite.run(repeat=repeat, only=only and only.split(','))
+    for route in suite.uncovered:
+        print(f'not benchmarked: {route}')
+    if output:
+        runner.write_results(output, results, users=users, database=database_url.split(':')[0])
+    if baseline:
+        regressions = runner.compare(results, runner.load_results(baseline), threshold)
+        for name, before, after, ratio in regressions:
+            print(f'REGRESSION {name}: {before * 1e3:.3f} ms -> {after * 1e3:.3f} ms ({ratio:.2f}x)')
+        if regressions:
+            return 1
+    return 0
+
 @manager.command
 def cov():
     """Runs the unit tests with coverage."""
@@ -0,0 +1,37 @@
+"""normalized emails with a unique index on lower(email)
+
+Revision ID: 4b8e2f6a9d13
+Revises: c5e9a1d4b7f2
+Create Date: 2026-10-19 03:05:48.221734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8e2f6a9d13'
+down_revision = 'c5e9a1d4b7f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    duplicates = bind.execute(
+        'SELECT lower(trim(email)) FROM users GROUP BY lower(trim(email)) HAVING count(*) > 1'
+    ).fetchall()
+    if duplicates:
+        # Merging accounts is not something a migration should decide.
+        raise RuntimeError('Emails differing only in case or whitespace must be resolved first: '
+                           + ', '.join(email for email, in duplicates))
+    op.execute('UPDATE users SET email = lower(trim(email)) WHERE email <> lower(trim(email))')
+    opclass = ' text_pattern_ops' if bind.dialect.name == 'postgresql' else ''
+    op.drop_index('ix_users_email_lower', table_name='users')
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)' + opclass)], unique=True)
+
+
+def downgrade():
+    opclass = ' text_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else ''
+    op.drop_index('ix_users_email_lower', table_name='users')
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)' + opclass)])
@@ -0,0 +1,26 @@
+"""users.updated_at for conditional requests
+
+Revision ID: 7f2c5d8e1b63
+Revises: e41a7c9b3f25
+Create Date: 2026-10-18 23:10:52.847120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f2c5d8e1b63'
+down_revision = 'e41a7c9b3f25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE users SET updated_at = created_at')
+    op.alter_column('users', 'updated_at', nullable=False)
+
+
+def downgrade():
+    op.drop_column('users', 'updated_at')
@@ -0,0 +1,34 @@
+"""byte-wise search_key indexes for ordered prefix search
+
+Revision ID: 8a3f6c2e9b57
+Revises: 4b8e2f6a9d13
+Create Date: 2026-10-19 09:26:03.518402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a3f6c2e9b57'
+down_revision = '4b8e2f6a9d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # lower(column) COLLATE "C" with the default operator class serves both
+    # LIKE 'q%' and ORDER BY, which text_pattern_ops cannot.
+    collate = ' COLLATE "C"' if op.get_bind().dialect.name == 'postgresql' else ''
+    op.drop_index('ix_users_username_lower', table_name='users')
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)' + collate), sa.text('id')])
+    op.drop_index('ix_users_email_lower', table_name='users')
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)' + collate)], unique=True)
+
+
+def downgrade():
+    opclass = ' text_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else ''
+    op.drop_index('ix_users_email_lower', table_name='users')
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)' + opclass)], unique=True)
+    op.drop_index('ix_users_username_lower', table_name='users')
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)' + opclass)])
@@ -0,0 +1,27 @@
+"""keyset index for paginated user listing
+
+Revision ID: 9c1f3e7a2d41
+Revises: b26743cb87a6
+Create Date: 2026-10-18 19:05:12.104233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1f3e7a2d41'
+down_revision = 'b26743cb87a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_users_created_at_id', 'users',
+        [sa.text('created_at DESC'), sa.text('id DESC')]
+    )
+
+
+def downgrade():
+    op.drop_index('ix_users_created_at_id', table_name='users')
@@ -0,0 +1,35 @@
+"""indexes for user search
+
+Revision ID: c5e9a1d4b7f2
+Revises: 7f2c5d8e1b63
+Create Date: 2026-10-19 01:42:17.360915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e9a1d4b7f2'
+down_revision = '7f2c5d8e1b63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    opclass = ' text_pattern_ops' if postgresql else ''
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)' + opclass)])
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)' + opclass)])
+    if postgresql:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX ix_users_username_trgm ON users USING gin (lower(username) gin_trgm_ops)')
+        op.execute('CREATE INDEX ix_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_users_email_trgm', table_name='users')
+        op.drop_index('ix_users_username_trgm', table_name='users')
+    op.drop_index('ix_users_email_lower', table_name='users')
+    op.drop_index('ix_users_username_lower', table_name='users')
@@ -1,13 +1,44 @@
 import os, datetime
 from flask import Flask, jsonify
-from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS, cross_origin
 from flask_migrate import Migrate
-from flask_bcrypt import Bcrypt
+from project.api.database import SQLAlchemy, pool_checkout_wait, pool_exhausted
+from project.api.cache import PrincipalCache, TakenIdentities, VerifiedTokens
+from project.api.denylist import TokenDenylist
+from project.api.hashing import HashingService
+from project.api.keys import SigningKeys
+from project.api.ratelimit import RateLimiter
+from project.api.metrics import Metrics
+from project.api.diagnostics import SQLDiagnostics
 
 db = SQLAlchemy()
 migrate = Migrate()
-bcrypt = Bcrypt()
+principals = PrincipalCache()
+taken_identities = TakenIdentities()
+denylist = TokenDenylist()
+verified_tokens = VerifiedTokens()
+hasher = HashingService()
+signing_keys = SigningKeys()
+rate_limiter = RateLimiter()
+metrics = Metrics()
+sql_diagnostics = SQLDiagnostics()
+
+metrics.registry.register(pool_checkout_wait)
+metrics.registry.register(pool_exhausted)
+metrics.callback('password_hashing_pool_in_flight', 'Hashing calls running or waiting.',
+                 lambda: hasher.stats()['in_flight'])
+metrics.callback('password_hashing_pool_queue_depth', 'Hashing calls waiting for a worker.',
+                 lambda: hasher.stats()['queue_depth'])
+metrics.callback('password_hashing_pool_rejected_total', 'Hashing calls rejected because the pool was full.',
+                 lambda: hasher.stats()['rejected'], type='counter')
+metrics.callback('password_hashing_pool_wait_seconds_total', 'Time hashing calls spent waiting for a worker.',
+                 lambda: hasher.stats()['wait_seconds_total'], type='counter')
+metrics.callback('verified_token_cache_hits_total', 'Auth tokens answered from the verified-token cache.',
+                 lambda: verified_tokens.stats()['hits'], type='counter')
+metrics.callback('verified_token_cache_misses_total', 'Auth tokens whose signature had to be checked.',
+                 lambda: verified_tokens.stats()['misses'], type='counter')
+metrics.callback('rate_limited_total', 'Login and registration attempts rejected by rate limits.',
+                 lambda: rate_limiter.stats()['rejected'], type='counter')
 
 def create_app():
     app = Flask(__name__)
@@ -16,7 +47,15 @@ def create_app():
     app.config.from_object(app_settings)
 
     db.init_app(app)
-    bcrypt.init_app(app)
+    principals.init_app(app)
+    taken_identities.init_app(app)
+    denylist.init_app(app)
+    verified_tokens.init_app(app)
+    hasher.init_app(app)
+    signing_keys.init_app(app)
+    rate_limiter.init_app(app)
+    metrics.init_app(app)
+    sql_diagnostics.init_app(app)
     migrate.init_app(app, db)
 
     # register blueprints
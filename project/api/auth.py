@@ -1,12 +1,16 @@
-from flask import Blueprint, jsonify, request
-from sqlalchemy import exc, or_
+from flask import Blueprint, current_app, request, g
+from sqlalchemy import exc
 
-from project.api.utils import authenticate
-from project.api.models import User
-from project import db, bcrypt
+from project.api.utils import authenticate, read_only, get_current_user, hashing_unavailable, create_user, UserExists, \
+    is_admin, revoke_token, rotate_refresh_token, InvalidRefreshToken, verify_token, load_principals, rate_limited
+from project.api.hashing import HashingUnavailable
+from project.api.models import RefreshToken, User
+from project.api.serialization import json_response, compress_response
+from project import db, hasher, signing_keys
 
 
 auth_blueprint = Blueprint('auth', __name__)
+auth_blueprint.after_request(compress_response)
 
 @auth_blueprint.route('/auth/register', methods=['POST'])
 def register_user():
@@ -16,40 +20,49 @@ def register_user():
             'status': 'error',
             'message': 'Invalid payload.'
         }
-        return jsonify(response_object), 400
+        return json_response(response_object), 400
     username = post_data.get('username')
     email = post_data.get('email')
     password = post_data.get('password')
+    if not username or not email or not password:
+        response_object = {
+            'status': 'error',
+            'message': 'Invalid payload.'
+        }
+        return json_response(response_object), 400
+    throttled = rate_limited('register', email)
+    if throttled:
+        return throttled
     try:
-        user = User.query.filter(or_(User.username==username, User.email==email)).first()
-        if not user:
-            new_user = User(
-                username = username,
-                email = email,
-                password = password
-            )
-            db.session.add(new_user)
-            db.session.commit()
-            auth_token= new_user.encode_auth_token(new_user.id)
-            response_object = {
-                'status': 'success',
-                'message': 'Successfully registered.',
-                'auth_token': auth_token.decode()
-            }
-            return jsonify(response_object), 201
-        else:
-            response_object = {
-                'status': 'error',
-                'message': 'Sorry. That user already exists.',
-            }
-            return jsonify(response_object), 400
+        user_id = create_user(username, email, password)
+        session_id = RefreshToken.new_family()
+        auth_token = User.encode_auth_token(user_id, session_id)
+        refresh_token = RefreshToken.issue(user_id, session_id)
+        db.session.commit()
+        response_object = {
+            'status': 'success',
+            'message': 'Successfully registered.',
+            'auth_token': auth_token.decode(),
+            'refresh_token': refresh_token
+        }
+        return json_response(response_object), 201
+    except UserExists as e:
+        response_object = {
+            'status': 'error',
+            'message': 'Sorry. That user already exists.',
+            'conflict': e.field
+        }
+        return json_response(response_object), 400
+    except HashingUnavailable:
+        db.session.rollback()
+        return hashing_unavailable()
     except (exc.IntegrityError, ValueError) as e:
         db.session.rollback()
         response_object = {
             'status': 'error',
             'message': 'Invalid payload.'
         }
-        return jsonify(response_object), 400
+        return json_response(response_object), 400
 
 @auth_blueprint.route('/auth/login', methods=['POST'])
 def login_user():
@@ -59,47 +72,167 @@ def login_user():
             'status': 'error',
             'message': 'Invalid payload.'
         }
-        return jsonify(response_object)
+        return json_response(response_object)
     email = post_data.get('email')
     password = post_data.get('password')
+    throttled = rate_limited('login', email)
+    if throttled:
+        return throttled
     try:
-        user = User.query.filter_by(email=email).first()
-        if user and bcrypt.check_password_hash(user.password, password):
-            auth_token = user.encode_auth_token(user.id)
+        user = User.find_by_email(email)
+        if user and hasher.verify_password(user.password, password):
+            upgrade_password_hash(user, password)
+            session_id = RefreshToken.new_family()
+            auth_token = user.encode_auth_token(user.id, session_id)
             if(auth_token):
+                refresh_token = RefreshToken.issue(user.id, session_id)
+                db.session.commit()
                 response_object = {
                     'status': 'success',
                     'message': 'Successfully logged in.',
-                    'auth_token': auth_token.decode()
+                    'auth_token': auth_token.decode(),
+                    'refresh_token': refresh_token
                 }
-                return jsonify(response_object), 200
+                return json_response(response_object), 200
         else:
             response_object = {
                 'status': 'error',
                 'message': 'User does not exist.'
             }
-            return jsonify(response_object), 404
+            return json_response(response_object), 404
+    except HashingUnavailable:
+        return hashing_unavailable()
     except Exception as e:
         print(e)
         response_object = {
             'status': 'error',
             'message': 'Try Again.'
         }
-        return jsonify(response_object), 500
+        return json_response(response_object), 500
+
+def upgrade_password_hash(user, password):
+    """Rehashes a verified password if the hashing policy has changed since
+    it was stored. Failing to upgrade never fails the login."""
+    if not hasher.needs_rehash(user.password):
+        return
+    try:
+        user.password = hasher.hash_password(password)
+        db.session.commit()
+    except (HashingUnavailable, exc.SQLAlchemyError):
+        db.session.rollback()
+
+@auth_blueprint.route('/auth/refresh', methods=['POST'])
+def refresh():
+    post_data = request.get_json()
+    if not post_data or not post_data.get('refresh_token'):
+        response_object = {
+            'status': 'error',
+            'message': 'Invalid payload.'
+        }
+        return json_response(response_object), 400
+    try:
+        user_id, session_id, refresh_token = rotate_refresh_token(post_data['refresh_token'])
+    except InvalidRefreshToken as e:
+        response_object = {
+            'status': 'error',
+            'message': e.message
+        }
+        return json_response(response_object), 401
+    response_object = {
+        'status': 'success',
+        'message': 'Token refreshed.',
+        'auth_token': User.encode_auth_token(user_id, session_id).decode(),
+        'refresh_token': refresh_token
+    }
+    return json_response(response_object), 200
+
+@auth_blueprint.route('/auth/introspect', methods=['POST'])
+def introspect():
+    """Checks many tokens at once, the way authenticate checks one, with a
+    single query for the users none of the caches know."""
+    post_data = request.get_json()
+    tokens = post_data.get('tokens') if isinstance(post_data, dict) else None
+    if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+        response_object = {
+            'status': 'error',
+            'message': 'Invalid payload.'
+        }
+        return json_response(response_object), 400
+    limit = current_app.config['INTROSPECT_MAX_TOKENS']
+    if len(tokens) > limit:
+        response_object = {
+            'status': 'error',
+            'message': f'At most {limit} tokens per request.'
+        }
+        return json_response(response_object), 400
+    claims = [verify_token(token) for token in tokens]
+    found = load_principals({c['sub'] for c in claims if isinstance(c, dict)})
+    results = []
+    for token_claims in claims:
+        if isinstance(token_claims, str):
+            results.append({'active': False, 'message': token_claims})
+            continue
+        principal = found.get(token_claims['sub'])
+        if principal is None or not principal.active:
+            results.append({'active': False, 'message': 'Something went wrong. Please contact us.'})
+            continue
+        results.append({
+            'active': True,
+            'user_id': principal.id,
+            'admin': principal.admin,
+            'exp': token_claims['exp']
+        })
+    response_object = {
+        'status': 'success',
+        'data': results
+    }
+    return json_response(response_object), 200
+
+@auth_blueprint.route('/auth/jwks', methods=['GET'])
+def jwks():
+    # Other services verify tokens locally against these keys.
+    max_age = current_app.config['JWKS_MAX_AGE']
+    return json_response(signing_keys.jwks()), 200, {'Cache-Control': f'public, max-age={max_age}'}
 
 @auth_blueprint.route('/auth/logout', methods=['GET'])
 @authenticate
-def logout_user(resp):
+def logout_user(principal):
+    revoke_token(g.auth_claims)
     response_object = {
         'status':'success',
         'message':'Successfully logged out.'
     }
-    return jsonify(response_object),200
+    return json_response(response_object),200
+
+@auth_blueprint.route('/auth/revoke', methods=['POST'])
+@authenticate
+def revoke(principal):
+    if not is_admin(principal):
+        response_object = {
+            'status': 'error',
+            'message': 'You do not have permission to do that.'
+        }
+        return json_response(response_object), 401
+    post_data = request.get_json()
+    claims = User.decode_auth_claims(post_data.get('token', '')) if post_data else None
+    if not isinstance(claims, dict):
+        response_object = {
+            'status': 'error',
+            'message': 'Invalid payload.'
+        }
+        return json_response(response_object), 400
+    revoke_token(claims)
+    response_object = {
+        'status': 'success',
+        'message': 'Token revoked.'
+    }
+    return json_response(response_object), 200
 
 @auth_blueprint.route('/auth/status', methods=['GET'])
 @authenticate
-def status(resp):
-    user = User.query.filter_by(id=resp).first()
+@read_only
+def status(principal):
+    user = get_current_user()
     response_object = {
         'status': 'success',
         'data': {
@@ -110,5 +243,5 @@ def status(resp):
             'created_at': user.created_at
         }
     }
-    return jsonify(response_object),200
+    return json_response(response_object),200
 
@@ -0,0 +1,111 @@
+import csv, datetime, json
+from itertools import islice
+from flask import current_app
+from sqlalchemy import exc, or_
+from project import db, hasher
+from project.api.models import User, normalize_email
+from project.api.passwords import scheme_for_config
+
+BULK_FORMATS = ('jsonl', 'csv')
+
+def iter_rows(lines, fmt):
+    """Yields (row_number, row) pairs from JSON lines or CSV text lines.
+
+    A row that cannot be parsed is yielded as None so it can be reported
+    without aborting the rest of the import."""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(lines), 1):
+            yield number, row
+        return
+    for number, line in enumerate((line for line in lines if line.strip()), 1):
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+def import_users(rows, batch_size=None, executor=None):
+    """Creates users from (row_number, row) pairs and yields one result per row.
+
+    Each batch costs one duplicate check, one executemany insert and one
+    commit. Passwords are hashed with executor.map: by default the shared,
+    bounded hashing pool, which raises HashingUnavailable when it is full.
+    Offline imports may pass a process pool of their own."""
+    batch_size = batch_size or current_app.config.get('BULK_IMPORT_BATCH_SIZE')
+    executor = executor or hasher
+    scheme = scheme_for_config(current_app.config)
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        yield from _import_batch(batch, scheme, executor)
+
+def _result(number, row, status, message):
+    email = row.get('email') if row else None
+    return {'row': number, 'email': email, 'status': status, 'message': message}
+
+def _import_batch(batch, scheme, executor):
+    results = {}
+    candidates = []
+    for number, row in batch:
+        if not row or not all(isinstance(row.get(key), str) and row.get(key)
+                              for key in ('username', 'email', 'password')):
+            results[number] = _result(number, row, 'invalid', 'Invalid payload keys')
+        else:
+            candidates.append((number, dict(row, email=normalize_email(row['email']))))
+
+    usernames = {row['username'] for _, row in candidates}
+    emails = {row['email'] for _, row in candidates}
+    taken = set()
+    if candidates:
+        for username, email in db.session.query(User.username, User.email).filter(
+                or_(User.username.in_(usernames), User.email.in_(emails))):
+            taken.update((('username', username), ('email', email)))
+
+    new_rows = []
+    for number, row in candidates:
+        keys = {('username', row['username']), ('email', row['email'])}
+        if keys & taken:
+            results[number] = _result(number, row, 'duplicate', 'User already exists')
+        else:
+            taken.update(keys)
+            new_rows.append((number, row))
+
+    if new_rows:
+        hashes = list(executor.map(scheme.hash, [row['password'] for _, row in new_rows]))
+        created_at = datetime.datetime.utcnow()
+        mappings = [
+            dict(username=row['username'], email=row['email'], password=pw_hash, created_at=created_at)
+            for (_, row), pw_hash in zip(new_rows, hashes)
+        ]
+        for (number, row), status in zip(new_rows, _insert(mappings)):
+            if status == 'created':
+                results[number] = _result(number, row, 'created', f"{row['email']} was added!")
+            else:
+                results[number] = _result(number, row, 'duplicate', 'User already exists')
+
+    for number, _ in batch:
+        yield results[number]
+
+def _insert(mappings):
+    """Inserts mappings with a single executemany, falling back to one insert
+    per row when a concurrent writer claimed a username or email after the
+    duplicate check."""
+    insert = User.__table__.insert()
+    try:
+        db.session.execute(insert, mappings)
+        db.session.commit()
+        return ['created'] * len(mappings)
+    except exc.IntegrityError:
+        db.session.rollback()
+    statuses = []
+    for mapping in mappings:
+        try:
+            db.session.execute(insert, mapping)
+            db.session.commit()
+            statuses.append('created')
+        except exc.IntegrityError:
+            db.session.rollback()
+            statuses.append('duplicate')
+    return statuses
@@ -0,0 +1,176 @@
+import hashlib, threading, time
+from collections import OrderedDict, namedtuple
+from werkzeug.utils import import_string
+
+Principal = namedtuple('Principal', ['id', 'active', 'admin'])
+
+class CacheBackend:
+    """Interface for principal cache storage backends."""
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+class MemoryBackend(CacheBackend):
+    """Process-local LRU cache whose entries also expire after a TTL."""
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class PrincipalCache:
+    """Caches the (id, active, admin) principal of users across requests."""
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PRINCIPAL_CACHE_BACKEND', 'project.api.cache.MemoryBackend')
+        app.config.setdefault('PRINCIPAL_CACHE_SIZE', 10000)
+        app.config.setdefault('PRINCIPAL_CACHE_TTL', 30)
+        backend = app.config['PRINCIPAL_CACHE_BACKEND']
+        if isinstance(backend, str):
+            backend = import_string(backend)
+        self.backend = backend(
+            maxsize=app.config['PRINCIPAL_CACHE_SIZE'],
+            ttl=app.config['PRINCIPAL_CACHE_TTL']
+        )
+
+    def get(self, user_id):
+        return self.backend.get(user_id)
+
+    def add(self, user):
+        principal = Principal(id=user.id, active=user.active, admin=user.admin)
+        self.backend.set(user.id, principal)
+        return principal
+
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+
+    def clear(self):
+        self.backend.clear()
+
+class TakenIdentities:
+    """Remembers usernames and emails recently seen in use, so repeated
+    sign-ups for them can be turned away before paying for a password hash.
+
+    Entries are only hints: a miss never means the identity is free, and a
+    hit expires after REGISTRATION_TAKEN_CACHE_TTL seconds."""
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REGISTRATION_TAKEN_CACHE_BACKEND', 'project.api.cache.MemoryBackend')
+        app.config.setdefault('REGISTRATION_TAKEN_CACHE_SIZE', 10000)
+        app.config.setdefault('REGISTRATION_TAKEN_CACHE_TTL', 300)
+        backend = app.config['REGISTRATION_TAKEN_CACHE_BACKEND']
+        if isinstance(backend, str):
+            backend = import_string(backend)
+        self.backend = backend(
+            maxsize=app.config['REGISTRATION_TAKEN_CACHE_SIZE'],
+            ttl=app.config['REGISTRATION_TAKEN_CACHE_TTL']
+        )
+
+    def add(self, field, value):
+        self.backend.set((field, value), True)
+
+    def find(self, **identities):
+        """Returns the first field whose value is known to be taken, if any."""
+        for field, value in sorted(identities.items()):
+            if self.backend.get((field, value)):
+                return field
+        return None
+
+    def clear(self):
+        self.backend.clear()
+
+class VerifiedTokens:
+    """Remembers the claims of recently verified auth tokens, keyed by the
+    token's SHA-256, so a token presented again skips JSON parsing and the
+    signature check. Callers must still check the exp claim on a hit."""
+    def __init__(self, app=None):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('VERIFIED_TOKEN_CACHE_BACKEND', 'project.api.cache.MemoryBackend')
+        app.config.setdefault('VERIFIED_TOKEN_CACHE_SIZE', 10000)
+        backend = app.config['VERIFIED_TOKEN_CACHE_BACKEND']
+        if isinstance(backend, str):
+            backend = import_string(backend)
+        self.backend = backend(maxsize=app.config['VERIFIED_TOKEN_CACHE_SIZE'], ttl=0)
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token if isinstance(token, bytes) else token.encode()).digest()
+
+    def get(self, token):
+        claims = self.backend.get(self._key(token))
+        with self._lock:
+            if claims is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return claims
+
+    def add(self, token, claims):
+        # Kept a second past exp so the caller's exact check, not the
+        # backend's clock, decides when the token stops being valid.
+        ttl = claims['exp'] - time.time() + 1
+        if ttl > 0:
+            self.backend.set(self._key(token), claims, ttl=ttl)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        self.backend.clear()
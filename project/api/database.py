@@ -0,0 +1,173 @@
+import itertools, threading, time
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy import SQLAlchemy as _SQLAlchemy, SignallingSession
+from sqlalchemy import event, exc, orm
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from project.api.cache import MemoryBackend
+from project.api.metrics import Counter, Histogram, LATENCY_BUCKETS
+
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_pre_ping')
+
+pool_checkout_wait = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting to check a connection out of the pool.',
+    buckets=(.0001, .0005) + LATENCY_BUCKETS)
+pool_exhausted = Counter(
+    'db_pool_exhausted_total', 'Checkouts that timed out because the pool and its overflow were in use.')
+replica_ejections = Counter(
+    'db_replica_ejections_total', 'Times a read replica was taken out of rotation after an error.', ('bind',))
+
+def _ping_connection(dbapi_connection, connection_record, connection_proxy):
+    # Pessimistic disconnect handling: a connection the server dropped while
+    # idle in the pool is replaced instead of failing the next query.
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    except Exception:
+        raise exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records checkout wait time and exhaustion."""
+    def __init__(self, creator, pre_ping=False, **kw):
+        super().__init__(creator, **kw)
+        if pre_ping and not event.contains(self, 'checkout', _ping_connection):
+            event.listen(self, 'checkout', _ping_connection)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_exhausted.inc()
+            raise
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+class ReplicaRouter:
+    """Round-robin choice among the binds listed in SQLALCHEMY_REPLICA_BINDS.
+
+    A replica that fails with a connection error is skipped for
+    REPLICA_EJECT_SECONDS. Users who wrote within the last
+    REPLICA_READ_YOUR_WRITES_SECONDS read from the primary so they see
+    their own changes despite replication lag."""
+    def __init__(self):
+        self._next = itertools.count()
+        self._ejected = {}
+        self._lock = threading.Lock()
+        self.writers = MemoryBackend()
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_BINDS', [])
+        app.config.setdefault('REPLICA_EJECT_SECONDS', 30)
+        app.config.setdefault('REPLICA_READ_YOUR_WRITES_SECONDS', 5)
+        self.writers = MemoryBackend(maxsize=10000, ttl=app.config['REPLICA_READ_YOUR_WRITES_SECONDS'])
+
+    def choose(self, binds):
+        """Returns the next healthy replica bind, or None for the primary."""
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(binds)):
+                bind = binds[next(self._next) % len(binds)]
+                if self._ejected.get(bind, 0) <= now:
+                    return bind
+        return None
+
+    def eject(self, bind, seconds):
+        with self._lock:
+            self._ejected[bind] = time.monotonic() + seconds
+        replica_ejections.inc(bind=bind)
+
+    def restore(self):
+        """Puts every replica back in rotation, starting from the first."""
+        with self._lock:
+            self._ejected.clear()
+            self._next = itertools.count()
+
+    def wrote(self, user_id):
+        self.writers.set(user_id, True)
+
+    def recently_wrote(self, user_id):
+        return user_id is not None and self.writers.get(user_id) is not None
+
+class RoutingSession(SignallingSession):
+    """Sends reads made inside SQLAlchemy.read_replica() to a replica. Flushes
+    and everything else use the primary, and a request keeps the replica
+    it was first given."""
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and has_app_context() and g.get('_use_replica'):
+            bind = g.get('replica_bind')
+            if bind is None:
+                bind = g.replica_bind = self.db.router.choose(self.app.config['SQLALCHEMY_REPLICA_BINDS'])
+            if bind is not None:
+                return self.db.get_engine(self.app, bind)
+        return super().get_bind(mapper, clause)
+
+class SQLAlchemy(_SQLAlchemy):
+    """Flask-SQLAlchemy with pool pre-ping, statement timeouts, pool metrics
+    and read-replica routing."""
+    def __init__(self, *args, **kwargs):
+        self.router = ReplicaRouter()
+        super().__init__(*args, **kwargs)
+
+    def init_app(self, app):
+        super().init_app(app)
+        self.router.init_app(app)
+        if not event.contains(Engine, 'handle_error', self._handle_error):
+            event.listen(Engine, 'handle_error', self._handle_error)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    @contextmanager
+    def read_replica(self, user_id=None):
+        """Routes reads in the block to a replica unless user_id wrote recently."""
+        previous = g.get('_use_replica', False)
+        g._use_replica = not self.router.recently_wrote(user_id)
+        try:
+            yield
+        finally:
+            g._use_replica = previous
+
+    def _handle_error(self, context):
+        if not has_app_context() or context.engine is None:
+            return
+        if not (context.is_disconnect or isinstance(context.sqlalchemy_exception, exc.OperationalError)):
+            return
+        app = current_app._get_current_object()
+        for bind in app.config.get('SQLALCHEMY_REPLICA_BINDS') or ():
+            if self.get_engine(app, bind) is context.engine:
+                self.router.eject(bind, app.config['REPLICA_EJECT_SECONDS'])
+
+    def apply_pool_defaults(self, app, options):
+        super().apply_pool_defaults(app, options)
+        if app.config.get('SQLALCHEMY_POOL_PRE_PING'):
+            options['pool_pre_ping'] = True
+
+    def apply_driver_hacks(self, app, info, options):
+        if info.drivername == 'sqlite':
+            # SQLite gets NullPool or StaticPool, which take none of these.
+            for option in QUEUE_POOL_OPTIONS:
+                options.pop(option, None)
+        super().apply_driver_hacks(app, info, options)
+        if 'poolclass' not in options:
+            options['poolclass'] = TimedQueuePool
+            if options.pop('pool_pre_ping', False):
+                options['pre_ping'] = True
+        timeout = app.config.get('SQLALCHEMY_STATEMENT_TIMEOUT_MS')
+        if timeout and info.drivername.startswith('postgresql'):
+            connect_args = options.setdefault('connect_args', {})
+            connect_args['options'] = f'-c statement_timeout={int(timeout)}'
+
+def dispose_engines(app):
+    """Drops every pooled connection. Forking servers must call this in each
+    worker after the fork so no connection is shared with the parent."""
+    with app.app_context():
+        for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or ()):
+            app.extensions['sqlalchemy'].db.get_engine(app, bind).dispose()
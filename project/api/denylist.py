@@ -0,0 +1,114 @@
+import datetime, hashlib, math, threading, time
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings. Membership tests have no false
+    negatives and about error_rate false positives once capacity items
+    have been added."""
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class TokenDenylist:
+    """Ids (jti) of revoked auth tokens, stored in the revoked_tokens table.
+
+    Lookups go to an in-process Bloom filter first, so a token that was
+    never revoked costs no query; only filter hits are confirmed against
+    the table. Every TOKEN_DENYLIST_REFRESH_SECONDS the filter picks up rows
+    other processes added since it last looked, and every
+    TOKEN_DENYLIST_PRUNE_SECONDS expired rows are deleted and the filter is
+    rebuilt from what is left."""
+    def __init__(self, app=None):
+        self.filter = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TOKEN_DENYLIST_CAPACITY', 100000)
+        app.config.setdefault('TOKEN_DENYLIST_ERROR_RATE', 0.001)
+        app.config.setdefault('TOKEN_DENYLIST_REFRESH_SECONDS', 5)
+        app.config.setdefault('TOKEN_DENYLIST_PRUNE_SECONDS', 3600)
+        app.config.setdefault('TOKEN_DENYLIST_REFRESH_OVERLAP', 1000)
+        self.capacity = app.config['TOKEN_DENYLIST_CAPACITY']
+        self.error_rate = app.config['TOKEN_DENYLIST_ERROR_RATE']
+        self.refresh_seconds = app.config['TOKEN_DENYLIST_REFRESH_SECONDS']
+        self.prune_seconds = app.config['TOKEN_DENYLIST_PRUNE_SECONDS']
+        self.refresh_overlap = app.config['TOKEN_DENYLIST_REFRESH_OVERLAP']
+        self.clear()
+
+    def revoke(self, jti, expires_at):
+        """Revokes the token jti until expires_at, a naive UTC datetime."""
+        from project import db
+        from project.api.models import RevokedToken
+        if not self.is_revoked(jti):
+            db.session.add(RevokedToken(jti=jti, expires_at=expires_at))
+            db.session.commit()
+        with self._lock:
+            self.filter.add(jti)
+
+    def is_revoked(self, jti):
+        from project import db
+        from project.api.models import RevokedToken
+        self.refresh()
+        if jti not in self.filter:
+            return False
+        return db.session.query(RevokedToken.id).filter_by(jti=jti).first() is not None
+
+    def refresh(self, force=False):
+        from project import db
+        from project.api.models import RevokedToken
+        now = time.monotonic()
+        if not force and now < self._refresh_at:
+            return
+        # One thread refreshes while the others keep using the current
+        # filter, unless there is none loaded yet.
+        if not self._lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            if not force and time.monotonic() < self._refresh_at:
+                return
+            self._refresh_at = now + self.refresh_seconds
+            if force or now >= self._prune_at:
+                self._prune_at = now + self.prune_seconds
+                expired = RevokedToken.query.filter(RevokedToken.expires_at < datetime.datetime.utcnow())
+                expired.delete(synchronize_session=False)
+                db.session.commit()
+                self.filter = BloomFilter(max(self.capacity, 2 * RevokedToken.query.count()), self.error_rate)
+                self._last_id = 0
+            # Ids are handed out before commit, so a lower id can become
+            # visible after a higher one. Rescanning the last
+            # refresh_overlap ids catches those; re-adding is harmless.
+            rows = db.session.query(RevokedToken.id, RevokedToken.jti) \
+                .filter(RevokedToken.id > self._last_id - self.refresh_overlap).all()
+            for row_id, jti in rows:
+                self.filter.add(jti)
+                self._last_id = max(self._last_id, row_id)
+            self._loaded = True
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Forgets the in-process filter. The next lookup prunes the table
+        and reloads it before answering."""
+        with self._lock:
+            self.filter = BloomFilter(self.capacity, self.error_rate)
+            self._last_id = 0
+            self._loaded = False
+            self._refresh_at = self._prune_at = 0
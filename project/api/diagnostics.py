@@ -0,0 +1,104 @@
+import re, time
+from collections import Counter
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+# Bind parameters whose values never go to the log, e.g. password hashes
+# and refresh token digests.
+REDACTED_PARAMETERS = ('password', 'token')
+
+def statement_shape(statement):
+    """Collapses inline literals so statements that differ only in their
+    values compare equal; bound parameters are already placeholders."""
+    return _LITERALS.sub('?', ' '.join(statement.split()))
+
+def loggable_parameters(context, parameters, values=False):
+    """Describes a statement's bound parameters for the log: their names,
+    or with values, each row's values with secrets redacted."""
+    rows = parameters if context.executemany else [parameters]
+    if rows and not isinstance(rows[0], dict):
+        if getattr(context.compiled, 'positional', False):
+            names = context.compiled.positiontup
+        else:
+            names = [str(position) for position in range(len(rows[0]))]
+        rows = [dict(zip(names, row)) for row in rows]
+    if not values:
+        names = sorted(rows[0]) if rows else []
+        return f'{names} x {len(rows)}' if context.executemany else str(names)
+    rows = [
+        {name: '<redacted>' if any(word in name for word in REDACTED_PARAMETERS) else value
+         for name, value in row.items()}
+        for row in rows
+    ]
+    return repr(rows if context.executemany else rows[0])
+
+def _route():
+    if has_request_context():
+        return f'{request.method} {request.endpoint or request.path}'
+    return 'no request'
+
+class SQLDiagnostics:
+    """Opt-in slow query log and repeated-query (N+1) detector.
+
+    With SQL_DIAGNOSTICS on, statements slower than SLOW_QUERY_THRESHOLD_MS
+    are logged with their route and the names of their parameters (values
+    too with SLOW_QUERY_LOG_VALUES, secrets redacted), and a request that runs the
+    same statement shape more than REPEATED_QUERY_THRESHOLD times is flagged.
+    Observers (see project.tests.utils.query_budget) receive every request's
+    statements whether or not logging is on."""
+    def __init__(self, app=None):
+        self.observers = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_DIAGNOSTICS', False)
+        app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', 100)
+        app.config.setdefault('SLOW_QUERY_LOG_VALUES', False)
+        app.config.setdefault('REPEATED_QUERY_THRESHOLD', 1)
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _enabled(self):
+        return has_app_context() and current_app.config['SQL_DIAGNOSTICS']
+
+    def _start(self):
+        if self.observers or self._enabled():
+            g._sql_statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._diagnostics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        statements = g.get('_sql_statements') if has_app_context() else None
+        if statements is not None:
+            statements.append(statement)
+        if not self._enabled():
+            return
+        elapsed_ms = (time.perf_counter() - context._diagnostics_started) * 1000
+        if elapsed_ms >= current_app.config['SLOW_QUERY_THRESHOLD_MS']:
+            current_app.logger.warning(
+                'Slow query (%.1f ms) from %s: %s %s', elapsed_ms, _route(), statement,
+                loggable_parameters(context, parameters, current_app.config['SLOW_QUERY_LOG_VALUES'])
+            )
+
+    def _finish(self, response):
+        statements = g.get('_sql_statements')
+        if statements is None:
+            return response
+        route = _route()
+        for observer in list(self.observers):
+            observer(route, statements)
+        if self._enabled():
+            threshold = current_app.config['REPEATED_QUERY_THRESHOLD']
+            for shape, count in Counter(map(statement_shape, statements)).items():
+                if count > threshold:
+                    current_app.logger.warning(
+                        'Possible N+1: %s ran the same query %d times: %s', route, count, shape
+                    )
+        return response
@@ -0,0 +1,124 @@
+import collections, os, threading, time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError
+from flask import current_app
+from project.api.passwords import identify, scheme_for_config
+from project.api.metrics import timed
+
+class HashingUnavailable(Exception):
+    """Raised when every slot of the hashing pool is taken, or when a call
+    waited longer than HASHING_TIMEOUT for its result."""
+
+def _run(fn, args):
+    # Runs inside the pool; wall clock so the start time is comparable
+    # across processes.
+    return time.time(), fn(*args)
+
+class HashingService:
+    """Runs password hashing on a bounded thread or process pool.
+
+    At most HASHING_POOL_WORKERS calls run at once and HASHING_POOL_QUEUE_SIZE
+    more may wait; past that, calls fail immediately with HashingUnavailable
+    instead of piling up behind the request workers."""
+    def __init__(self, app=None):
+        self._executor = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('HASHING_POOL_KIND', 'thread')
+        app.config.setdefault('HASHING_POOL_WORKERS', os.cpu_count() or 1)
+        app.config.setdefault('HASHING_POOL_QUEUE_SIZE', 16)
+        app.config.setdefault('HASHING_TIMEOUT', 30)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.workers = app.config['HASHING_POOL_WORKERS']
+        self.timeout = app.config['HASHING_TIMEOUT']
+        if app.config['HASHING_POOL_KIND'] == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._slots = threading.BoundedSemaphore(self.workers + app.config['HASHING_POOL_QUEUE_SIZE'])
+        self._in_flight = 0
+        self._rejected = 0
+        self._completed = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    def submit(self, fn, *args):
+        """Schedules fn(*args) on the pool and returns a future of its result."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingUnavailable('Password hashing pool is saturated.')
+        submitted_at = time.time()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(_run, fn, args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(lambda f: self._release(f, submitted_at))
+        return future
+
+    def _release(self, future, submitted_at=None):
+        self._slots.release()
+        with self._lock:
+            self._in_flight -= 1
+            if future is not None and not future.cancelled() and future.exception() is None:
+                wait = max(0.0, future.result()[0] - submitted_at)
+                self._completed += 1
+                self._wait_seconds += wait
+                self._max_wait_seconds = max(self._max_wait_seconds, wait)
+
+    def _result(self, future):
+        with timed('hashing'):
+            try:
+                return future.result(self.timeout)[1]
+            except TimeoutError:
+                raise HashingUnavailable('Password hashing timed out.')
+
+    def call(self, fn, *args):
+        return self._result(self.submit(fn, *args))
+
+    def map(self, fn, iterable):
+        """Yields fn(item) for each item, in order. At most workers of these
+        calls are on the pool at a time, so a bulk caller leaves room for
+        others; like call, it raises HashingUnavailable when the pool is full."""
+        pending = collections.deque()
+        try:
+            for item in iterable:
+                if len(pending) >= self.workers:
+                    yield self._result(pending.popleft())
+                pending.append(self.submit(fn, item))
+            while pending:
+                yield self._result(pending.popleft())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def hash_password(self, password):
+        """Hashes password with the scheme and cost currently configured."""
+        if not password:
+            raise ValueError('Password must be non-empty.')
+        return self.call(scheme_for_config(current_app.config).hash, password)
+
+    def verify_password(self, pw_hash, password):
+        """Verifies password with whichever scheme produced pw_hash."""
+        return self.call(identify(pw_hash).verify, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        return identify(pw_hash) != scheme_for_config(current_app.config)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'in_flight': self._in_flight,
+                'queue_depth': max(0, self._in_flight - self.workers),
+                'rejected': self._rejected,
+                'completed': self._completed,
+                'wait_seconds_total': self._wait_seconds,
+                'wait_seconds_max': self._max_wait_seconds,
+            }
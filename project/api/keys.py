@@ -0,0 +1,85 @@
+import json, os, threading
+import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from flask import current_app
+from jwt.algorithms import RSAAlgorithm
+
+ASYMMETRIC_ALGORITHMS = ('RS256', 'RS384', 'RS512')
+
+class SigningKeys:
+    """Signs and verifies auth tokens.
+
+    With JWT_ALGORITHM = 'HS256' (the default) tokens are signed with
+    SECRET_KEY. With an RS* algorithm every <kid>.pem file in JWT_KEY_DIR
+    (private or public PEM) can verify tokens carrying that kid, and the
+    private key named by JWT_SIGNING_KID signs new ones. To rotate, add the
+    new key, switch JWT_SIGNING_KID, and delete the old file once the
+    tokens it signed have expired. Keys are read on first use."""
+    def __init__(self, app=None):
+        self._loaded = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JWT_ALGORITHM', 'HS256')
+        app.config.setdefault('JWT_KEY_DIR', None)
+        app.config.setdefault('JWT_SIGNING_KID', None)
+        app.config.setdefault('JWKS_MAX_AGE', 3600)
+
+    def _keys(self):
+        """Returns (algorithm, signing kid, signing key, {kid: public key})."""
+        config = current_app.config
+        settings = (config['JWT_ALGORITHM'], config['JWT_KEY_DIR'], config['JWT_SIGNING_KID'])
+        with self._lock:
+            if settings not in self._loaded:
+                self._loaded[settings] = self._load(*settings)
+            return self._loaded[settings]
+
+    @staticmethod
+    def _load(algorithm, key_dir, signing_kid):
+        if algorithm == 'HS256':
+            return algorithm, None, None, {}
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise ValueError(f'Unsupported JWT_ALGORITHM {algorithm!r}')
+        private_keys, public_keys = {}, {}
+        for name in sorted(os.listdir(key_dir)):
+            if not name.endswith('.pem'):
+                continue
+            kid = name[:-len('.pem')]
+            with open(os.path.join(key_dir, name), 'rb') as f:
+                pem = f.read()
+            if b'PRIVATE KEY' in pem:
+                private_keys[kid] = serialization.load_pem_private_key(pem, None, default_backend())
+                public_keys[kid] = private_keys[kid].public_key()
+            else:
+                public_keys[kid] = serialization.load_pem_public_key(pem, default_backend())
+        if signing_kid not in private_keys:
+            raise ValueError(f'JWT_SIGNING_KID must name a private key in {key_dir}')
+        return algorithm, signing_kid, private_keys[signing_kid], public_keys
+
+    def encode(self, payload):
+        algorithm, kid, key, _ = self._keys()
+        if kid is None:
+            return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm=algorithm)
+        return jwt.encode(payload, key, algorithm=algorithm, headers={'kid': kid})
+
+    def decode(self, token):
+        algorithm, kid, _, public_keys = self._keys()
+        if kid is None:
+            return jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=[algorithm])
+        key = public_keys.get(jwt.get_unverified_header(token).get('kid'))
+        if key is None:
+            raise jwt.InvalidTokenError('Unknown key id')
+        return jwt.decode(token, key, algorithms=[algorithm])
+
+    def jwks(self):
+        """The public keys as a JSON Web Key Set."""
+        algorithm, _, _, public_keys = self._keys()
+        keys = []
+        for kid, key in sorted(public_keys.items()):
+            jwk = json.loads(RSAAlgorithm.to_jwk(key))
+            jwk.update(kid=kid, alg=algorithm, use='sig')
+            keys.append(jwk)
+        return {'keys': keys}
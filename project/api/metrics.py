@@ -0,0 +1,190 @@
+import threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield self.name + '_bucket', labels + [('le', _format_value(bound))], cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, cumulative
+
+class Callback:
+    """A gauge or counter whose value is read from a callback at scrape time."""
+    def __init__(self, name, help, callback, type='gauge'):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.type = type
+
+    def samples(self):
+        yield self.name, [], self.callback()
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+def record(component, seconds):
+    """Adds seconds spent in component (e.g. 'sql', 'hashing', 'jwt') to the
+    current request's totals. Outside a request this is a no-op."""
+    stats = g.get('_request_metrics') if g else None
+    if stats is not None:
+        stats[component] = stats.get(component, 0.0) + seconds
+        stats[component + '_calls'] = stats.get(component + '_calls', 0) + 1
+
+@contextmanager
+def timed(component):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(component, time.perf_counter() - started)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is not None:
+        record('sql', time.perf_counter() - started)
+
+class Metrics:
+    """Per-endpoint request metrics served at /metrics in the Prometheus text
+    exposition format."""
+    def __init__(self, app=None):
+        self.registry = Registry()
+        labels = ('endpoint', 'method')
+        self.requests = self.registry.register(Counter(
+            'http_requests_total', 'Requests handled.', labels + ('status',)))
+        self.latency = self.registry.register(Histogram(
+            'http_request_duration_seconds', 'Request latency.', labels))
+        self.sql_queries = self.registry.register(Histogram(
+            'http_request_sql_queries', 'SQL statements executed per request.', labels, COUNT_BUCKETS))
+        self.sql_time = self.registry.register(Histogram(
+            'http_request_sql_seconds', 'Time spent executing SQL per request.', labels))
+        self.hashing_time = self.registry.register(Histogram(
+            'http_request_password_hashing_seconds', 'Time spent hashing or verifying passwords per request.', labels))
+        self.jwt_time = self.registry.register(Histogram(
+            'http_request_jwt_seconds', 'Time spent encoding or decoding tokens per request.', labels))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        if not app.config['METRICS_ENABLED']:
+            return
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._status)
+        # Flask skips after_request hooks when a view raises; teardown still
+        # runs, so failed requests are counted too.
+        app.teardown_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def callback(self, name, help, callback, type='gauge'):
+        return self.registry.register(Callback(name, help, callback, type))
+
+    def _start(self):
+        g._request_metrics = {'started': time.perf_counter()}
+
+    def _status(self, response):
+        stats = g.get('_request_metrics')
+        if stats is not None:
+            stats['status'] = response.status_code
+        return response
+
+    def _finish(self, exc):
+        stats = g.pop('_request_metrics', None)
+        if stats is None:
+            return
+        status = 500 if exc is not None else stats.get('status', 500)
+        labels = dict(endpoint=request.endpoint or 'unmatched', method=request.method)
+        self.requests.inc(status=str(status), **labels)
+        self.latency.observe(time.perf_counter() - stats['started'], **labels)
+        self.sql_queries.observe(stats.get('sql_calls', 0), **labels)
+        self.sql_time.observe(stats.get('sql', 0.0), **labels)
+        if 'hashing_calls' in stats:
+            self.hashing_time.observe(stats['hashing'], **labels)
+        if 'jwt_calls' in stats:
+            self.jwt_time.observe(stats['jwt'], **labels)
+
+    def view(self):
+        return Response(self.registry.render(), mimetype='text/plain; version=0.0.4')
@@ -1,6 +1,29 @@
-import datetime, jwt
-from flask import current_app
-from project import db, bcrypt
+import calendar, datetime, hashlib, jwt, secrets, uuid
+from flask import current_app, g, has_app_context
+from sqlalchemy import DDL, String, event, inspect
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import validates
+from sqlalchemy.sql.functions import GenericFunction
+from project import db, hasher, principals, signing_keys, verified_tokens
+from project.api.metrics import timed
+
+def normalize_email(email):
+    """The form emails are stored and looked up in: trimmed and lower case."""
+    return email.strip().lower() if isinstance(email, str) else email
+
+class search_key(GenericFunction):
+    """lower(column) compared byte-wise: lower(column) COLLATE "C" on
+    PostgreSQL, where a btree index on it serves both LIKE 'q%' ranges and
+    ordering. SQLite compares text byte-wise already."""
+    type = String()
+
+@compiles(search_key)
+def _compile_search_key(element, compiler, **kw):
+    return f'lower({compiler.process(element.clauses, **kw)})'
+
+@compiles(search_key, 'postgresql')
+def _compile_search_key_postgresql(element, compiler, **kw):
+    return f'lower({compiler.process(element.clauses, **kw)}) COLLATE "C"'
 
 class User(db.Model):
     __tablename__ = "users"
@@ -11,31 +34,167 @@ class User(db.Model):
     active = db.Column(db.Boolean(), default=True, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False)
     admin = db.Column(db.Boolean(), default=False, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow, nullable=False)
+    __table_args__ = (
+        db.Index('ix_users_created_at_id', created_at.desc(), id.desc()),
+        # Prefix search reads these in order; see search_users.
+        db.Index('ix_users_username_lower', search_key(username), id),
+        # Also rejects emails differing only in case, should one be written
+        # without going through normalize_email.
+        db.Index('ix_users_email_lower', search_key(email), unique=True),
+    )
 
     def __init__(self, username, email, password, created_at=datetime.datetime.utcnow()):
         self.username = username
         self.email = email
-        self.password = bcrypt.generate_password_hash(
-            password, current_app.config.get('BCRYPT_LOG_ROUNDS')
-        ).decode()
+        self.password = hasher.hash_password(password)
         self.created_at = created_at
+
+    @validates('email')
+    def validate_email(self, key, email):
+        return normalize_email(email)
+
+    @staticmethod
+    def find_by_email(email):
+        """Looks a user up by email in any case, with one probe of the
+        unique index on the stored, normalized column."""
+        return User.query.filter_by(email=normalize_email(email)).first()
     
-    def encode_auth_token(self, user_id):
+    @staticmethod
+    def encode_auth_token(user_id, session_id=None):
+        """session_id, the refresh token family issued alongside, lets
+        logging out with the access token end the refresh tokens too."""
         try:
             payload = {
                 'exp': datetime.datetime.utcnow() + datetime.timedelta(days=current_app.config.get('TOKEN_EXPIRATION_DAYS'), seconds=current_app.config.get('TOKEN_EXPIRATION_SECONDS')),
                 'iat': datetime.datetime.utcnow(),
-                'sub': user_id
+                'sub': user_id,
+                'jti': uuid.uuid4().hex
             }
-            return jwt.encode(payload, current_app.config.get('SECRET_KEY'), algorithm='HS256')
+            if session_id:
+                payload['sid'] = session_id
+            with timed('jwt'):
+                return signing_keys.encode(payload)
         except Exception as e:
             return e
     
     @staticmethod
     def decode_auth_token(token):
+        claims = User.decode_auth_claims(token)
+        return claims if isinstance(claims, str) else claims['sub']
+
+    @staticmethod
+    def decode_auth_claims(token):
+        """Returns the verified token payload, or an error message."""
+        if not isinstance(token, (str, bytes)):
+            return 'Invalid token. Please log in again.'
         try:
-            return jwt.decode(token, current_app.config.get('SECRET_KEY'), algorithm='HS256')['sub']
+            with timed('jwt'):
+                claims = verified_tokens.get(token)
+                if claims is None:
+                    claims = signing_keys.decode(token)
+                    verified_tokens.add(token, claims)
+                # The same whole-second comparison jwt.decode makes.
+                elif claims['exp'] < calendar.timegm(datetime.datetime.utcnow().utctimetuple()):
+                    raise jwt.ExpiredSignatureError()
+                return claims
         except jwt.ExpiredSignatureError:
             return 'Signature expired. Please log in again.'
         except jwt.InvalidTokenError:
-            return 'Invalid token. Please log in again.'
\ No newline at end of file
+            return 'Invalid token. Please log in again.'
+
+# Fuzzy search needs pg_trgm and trigram indexes, which a model cannot
+# declare; this gives create_all the same schema as the migrations.
+event.listen(User.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+event.listen(User.__table__, 'after_create', DDL(
+    'CREATE INDEX ix_users_username_trgm ON users USING gin (lower(username) gin_trgm_ops)'
+).execute_if(dialect='postgresql'))
+event.listen(User.__table__, 'after_create', DDL(
+    'CREATE INDEX ix_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops)'
+).execute_if(dialect='postgresql'))
+
+class RefreshToken(db.Model):
+    """A long-lived token that can be exchanged once for a new access token
+    and a new refresh token of the same family. Only its SHA-256 is stored:
+    the token is random, so a slow password hash would add nothing."""
+    __tablename__ = "refresh_tokens"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), index=True, nullable=False)
+    family = db.Column(db.String(32), index=True, nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    used_at = db.Column(db.DateTime)
+
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def new_family():
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def issue(user_id, family=None):
+        """Adds a new refresh token to the session and returns it."""
+        token = secrets.token_urlsafe(32)
+        db.session.add(RefreshToken(
+            user_id=user_id,
+            family=family or RefreshToken.new_family(),
+            token_hash=RefreshToken.hash_token(token),
+            expires_at=datetime.datetime.utcnow() + datetime.timedelta(
+                days=current_app.config.get('REFRESH_TOKEN_EXPIRATION_DAYS'))
+        ))
+        return token
+
+    @staticmethod
+    def end_family(family, now=None):
+        """Marks every unused token of family used, so none can be exchanged."""
+        RefreshToken.query.filter_by(family=family, used_at=None) \
+            .update({'used_at': now or datetime.datetime.utcnow()}, synchronize_session=False)
+
+class RevokedToken(db.Model):
+    __tablename__ = "revoked_tokens"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, index=True, nullable=False)
+
+@event.listens_for(db.session, 'after_flush')
+def invalidate_changed_principals(session, flush_context):
+    changed = session.info.setdefault('changed_principals', set())
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if state.attrs.active.history.has_changes() or state.attrs.admin.history.has_changes():
+                changed.add(obj.id)
+    for user_id in changed:
+        principals.invalidate(user_id)
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_committed_principals(session):
+    # Invalidate again once the change is visible to other connections, in
+    # case a concurrent request re-cached the old row between flush and commit.
+    for user_id in session.info.pop('changed_principals', ()):
+        principals.invalidate(user_id)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changed_principals(session):
+    session.info.pop('changed_principals', None)
+    session.info.pop('writers', None)
+
+@event.listens_for(db.session, 'after_flush')
+def collect_writers(session, flush_context):
+    writers = session.info.setdefault('writers', set())
+    writers.update(obj.id for obj in session.new | session.dirty if isinstance(obj, User))
+    principal = g.get('principal') if has_app_context() else None
+    if principal is not None:
+        writers.add(principal.id)
+
+@event.listens_for(db.session, 'after_commit')
+def pin_writers_to_primary(session):
+    for user_id in session.info.pop('writers', ()):
+        db.router.wrote(user_id)
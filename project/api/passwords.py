@@ -0,0 +1,103 @@
+import base64, hashlib, hmac, os
+import bcrypt as _bcrypt
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return value
+
+def _b64encode(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+def _b64decode(data):
+    return base64.b64decode(data + '=' * (-len(data) % 4))
+
+class BcryptScheme:
+    """bcrypt at a fixed cost, stored as $2b$<rounds>$<salt+hash>."""
+    name = 'bcrypt'
+    prefixes = ('$2a$', '$2b$', '$2y$')
+
+    def __init__(self, rounds=12):
+        self.rounds = rounds
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(rounds=config.get('BCRYPT_LOG_ROUNDS'))
+
+    @classmethod
+    def parse(cls, pw_hash):
+        return cls(rounds=int(pw_hash.split('$')[2]))
+
+    def hash(self, password):
+        return _bcrypt.hashpw(_to_bytes(password), _bcrypt.gensalt(self.rounds)).decode()
+
+    def verify(self, pw_hash, password):
+        pw_hash = _to_bytes(pw_hash)
+        return hmac.compare_digest(_bcrypt.hashpw(_to_bytes(password), pw_hash), pw_hash)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.rounds == other.rounds
+
+class ScryptScheme:
+    """hashlib scrypt, stored as $scrypt$ln=<log2 n>,r=<r>,p=<p>$<salt>$<hash>."""
+    name = 'scrypt'
+    prefixes = ('$scrypt$',)
+    salt_size = 16
+    key_size = 64
+
+    def __init__(self, log_n=14, r=8, p=1):
+        self.log_n = log_n
+        self.r = r
+        self.p = p
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(log_n=config.get('SCRYPT_LOG_N'), r=config.get('SCRYPT_R'), p=config.get('SCRYPT_P'))
+
+    @classmethod
+    def parse(cls, pw_hash):
+        params = dict(item.split('=') for item in pw_hash.split('$')[2].split(','))
+        return cls(log_n=int(params['ln']), r=int(params['r']), p=int(params['p']))
+
+    def _derive(self, password, salt):
+        if not hasattr(hashlib, 'scrypt'):
+            raise RuntimeError('hashlib.scrypt requires Python built against OpenSSL 1.1+.')
+        n = 2 ** self.log_n
+        return hashlib.scrypt(
+            _to_bytes(password), salt=salt, n=n, r=self.r, p=self.p,
+            maxmem=256 * n * self.r, dklen=self.key_size
+        )
+
+    def hash(self, password):
+        salt = os.urandom(self.salt_size)
+        return '$scrypt$ln={},r={},p={}${}${}'.format(
+            self.log_n, self.r, self.p, _b64encode(salt), _b64encode(self._derive(password, salt))
+        )
+
+    def verify(self, pw_hash, password):
+        salt, key = pw_hash.split('$')[3:5]
+        return hmac.compare_digest(self._derive(password, _b64decode(salt)), _b64decode(key))
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                (self.log_n, self.r, self.p) == (other.log_n, other.r, other.p))
+
+SCHEMES = {}
+
+def register_scheme(scheme):
+    SCHEMES[scheme.name] = scheme
+    return scheme
+
+register_scheme(BcryptScheme)
+register_scheme(ScryptScheme)
+
+def scheme_for_config(config):
+    """Returns the scheme new hashes should use under the given config."""
+    return SCHEMES[config.get('PASSWORD_SCHEME', 'bcrypt')].from_config(config)
+
+def identify(pw_hash):
+    """Returns the scheme, with its parameters, that produced pw_hash."""
+    for scheme in SCHEMES.values():
+        if pw_hash.startswith(scheme.prefixes):
+            return scheme.parse(pw_hash)
+    raise ValueError('Unknown password hash format.')
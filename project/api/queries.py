@@ -0,0 +1,99 @@
+"""Read model for the user endpoints.
+
+These functions run Core selects of only the columns a response needs and
+return plain dicts, so reads never hydrate User objects, load password
+hashes or touch the session's identity map. They go through db.session, so
+read replica routing applies as usual."""
+from sqlalchemy import func, or_, select, tuple_, union_all
+from project import db
+from project.api.models import User, search_key
+
+PUBLIC_USER_FIELDS = ('id', 'username', 'email', 'created_at')
+
+users = User.__table__
+
+def _rows(statement):
+    result = db.session.execute(statement)
+    keys = result.keys()
+    return [dict(zip(keys, row)) for row in result]
+
+def get_user_public(user_id):
+    """Returns the public fields and updated_at of a user, or None."""
+    statement = select([users.c[field] for field in PUBLIC_USER_FIELDS + ('updated_at',)]) \
+        .where(users.c.id == user_id)
+    rows = _rows(statement)
+    return rows[0] if rows else None
+
+def get_users_public(user_ids):
+    """Returns {id: row} for those of user_ids that exist; rows are as in
+    get_user_public."""
+    statement = select([users.c[field] for field in PUBLIC_USER_FIELDS + ('updated_at',)]) \
+        .where(users.c.id.in_(user_ids))
+    return {row['id']: row for row in _rows(statement)}
+
+def list_users(fields=PUBLIC_USER_FIELDS, limit=None, after=None):
+    """Returns up to limit users, newest first, starting after the
+    (created_at, id) key after. Rows hold fields plus the created_at, id
+    and updated_at columns that paging and ETags need."""
+    columns = set(fields) | {'created_at', 'id', 'updated_at'}
+    statement = select([users.c[field] for field in sorted(columns)]) \
+        .order_by(users.c.created_at.desc(), users.c.id.desc()) \
+        .limit(limit)
+    if after:
+        statement = statement.where(tuple_(users.c.created_at, users.c.id) < tuple_(*after))
+    return _rows(statement)
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_users(q, limit, after=None):
+    """Returns up to limit users whose username or email starts with q,
+    ignoring case, starting after the (search_key, id) key after. Rows are
+    as in get_user_public plus search_key: the lower-cased username, or the
+    email for users matched by email alone. Results are ordered by it.
+
+    Each prefix is read in order from its own search_key index, at most
+    limit rows each, and the two ranges are merged, so a page costs the
+    same whether q matches ten users or millions."""
+    pattern = _like_escape(q.lower()) + '%'
+    username_key, email_key = search_key(users.c.username), search_key(users.c.email)
+    columns = [users.c[field] for field in PUBLIC_USER_FIELDS + ('updated_at',)]
+
+    def prefix_range(key, *criteria):
+        statement = select(columns + [key.label('search_key')]) \
+            .where(key.like(pattern, escape='\\')) \
+            .order_by(key, users.c.id) \
+            .limit(limit)
+        for criterion in criteria:
+            statement = statement.where(criterion)
+        if after:
+            statement = statement.where(tuple_(key, users.c.id) > tuple_(*after))
+        return select([statement.alias()])
+
+    by_username = prefix_range(username_key)
+    # Users matching both ways are listed once, by username.
+    by_email = prefix_range(email_key, ~username_key.like(pattern, escape='\\'))
+    matches = union_all(by_username, by_email).alias('matches')
+    return _rows(select([matches]).order_by(matches.c.search_key, matches.c.id).limit(limit))
+
+def fuzzy_search_users(q, limit):
+    """Returns the limit users best matching q anywhere in their username or
+    email. On PostgreSQL this ranks by pg_trgm similarity, so near misses
+    match too; elsewhere it falls back to a case-insensitive substring match
+    ordered by username. q should be at least three characters long: the
+    trigram indexes cannot narrow down anything shorter."""
+    q = q.lower()
+    username_key, email_key = func.lower(users.c.username), func.lower(users.c.email)
+    columns = [users.c[field] for field in PUBLIC_USER_FIELDS + ('updated_at',)]
+    substring = '%' + _like_escape(q) + '%'
+    matches = or_(username_key.like(substring, escape='\\'), email_key.like(substring, escape='\\'))
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Python's % renders pg_trgm's similarity operator; like the LIKE
+        # tests it is answered from the gin_trgm_ops indexes.
+        statement = select(columns) \
+            .where(or_(matches, username_key % q, email_key % q)) \
+            .order_by(func.greatest(func.similarity(username_key, q), func.similarity(email_key, q)).desc(),
+                      users.c.id)
+    else:
+        statement = select(columns).where(matches).order_by(username_key, users.c.id)
+    return _rows(statement.limit(limit))
@@ -0,0 +1,97 @@
+import math, threading, time
+from collections import OrderedDict
+from werkzeug.utils import import_string
+
+class WindowBackend:
+    """Interface for rate limit counter storage. A shared backend (e.g. Redis
+    INCR plus EXPIRE on '<key>:<window_id>') makes limits hold across
+    processes."""
+    def incr(self, key, window_id, ttl):
+        """Atomically counts a hit for key in window window_id and returns
+        (hits in window_id, hits in window_id - 1). Counts may be dropped
+        after ttl seconds."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+class MemoryWindows(WindowBackend):
+    """Process-local counters: one [window_id, hits, previous hits] entry per
+    key, least recently hit keys evicted beyond maxsize."""
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def incr(self, key, window_id, ttl):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                entry = self._data[key] = [window_id, 0, 0]
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+            else:
+                self._data.move_to_end(key)
+                if entry[0] != window_id:
+                    previous = entry[1] if entry[0] == window_id - 1 else 0
+                    entry[:] = [window_id, 0, previous]
+            entry[1] += 1
+            return entry[1], entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class RateLimiter:
+    """Sliding window rate limits over RATE_LIMIT_WINDOW seconds.
+
+    Each key keeps a hit count for the current and the previous fixed window;
+    the previous count is weighted by how much of it the sliding window
+    still covers. Every attempt counts, including rejected ones, so a client
+    that keeps hammering stays throttled."""
+    def __init__(self, app=None):
+        self.backend = None
+        self.rejected = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMIT_ENABLED', True)
+        app.config.setdefault('RATE_LIMIT_BACKEND', 'project.api.ratelimit.MemoryWindows')
+        app.config.setdefault('RATE_LIMIT_SIZE', 100000)
+        app.config.setdefault('RATE_LIMIT_WINDOW', 60)
+        backend = app.config['RATE_LIMIT_BACKEND']
+        if isinstance(backend, str):
+            backend = import_string(backend)
+        self.backend = backend(maxsize=app.config['RATE_LIMIT_SIZE'])
+        self.window = app.config['RATE_LIMIT_WINDOW']
+
+    def hit(self, key, limit, now=None):
+        """Counts an attempt for key and returns 0 if it is within limit,
+        otherwise the number of seconds after which one would be."""
+        now = time.time() if now is None else now
+        window_id, offset = divmod(now, self.window)
+        hits, previous = self.backend.incr(key, int(window_id), 2 * self.window)
+        weight = 1 - offset / self.window
+        if previous * weight + hits <= limit:
+            return 0
+        with self._lock:
+            self.rejected += 1
+        # The next attempt adds one hit; find when the estimate leaves room
+        # for it, either later in this window or in the next one.
+        if hits + 1 <= limit:
+            wait = self.window * (1 - (limit - hits - 1) / previous) - offset
+        else:
+            wait = self.window - offset + self.window * (1 - (limit - 1) / hits)
+        return max(1, math.ceil(wait))
+
+    def stats(self):
+        with self._lock:
+            return {'rejected': self.rejected}
+
+    def clear(self):
+        self.backend.clear()
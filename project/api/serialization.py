@@ -0,0 +1,82 @@
+import datetime, gzip, json, zlib
+from flask import current_app, request
+
+def _default(value):
+    if isinstance(value, datetime.datetime):
+        # Naive datetimes in this service are UTC.
+        return value.isoformat() + ('Z' if value.tzinfo is None else '')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError(f'{value!r} is not JSON serializable')
+
+_stdlib_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+
+def _stdlib_dumps(obj):
+    return _stdlib_encoder.encode(obj).encode()
+
+ENCODERS = {'json': _stdlib_dumps}
+AUTO_ORDER = ('orjson', 'ujson', 'json')
+
+def register_encoder(name, dumps):
+    """Makes dumps (object -> UTF-8 bytes) selectable as JSON_ENCODER."""
+    ENCODERS[name] = dumps
+
+try:
+    import orjson
+except ImportError:
+    pass
+else:
+    register_encoder('orjson', lambda obj: orjson.dumps(
+        obj, default=_default, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z))
+
+try:
+    import ujson
+except ImportError:
+    pass
+else:
+    register_encoder('ujson', lambda obj: ujson.dumps(
+        obj, ensure_ascii=False, escape_forward_slashes=False, default=_default).encode())
+
+def get_encoder(name):
+    """Returns the named encoder; 'auto' is the fastest one installed."""
+    if name == 'auto':
+        return next(ENCODERS[candidate] for candidate in AUTO_ORDER if candidate in ENCODERS)
+    try:
+        return ENCODERS[name]
+    except KeyError:
+        raise ValueError(f'Unknown JSON_ENCODER {name!r}')
+
+def dumps(obj):
+    return get_encoder(current_app.config['JSON_ENCODER'])(obj)
+
+def json_response(obj, status=200, headers=None):
+    """Replacement for jsonify using the configured encoder, with
+    datetimes as ISO 8601 strings."""
+    return current_app.response_class(dumps(obj), status=status, headers=headers, mimetype='application/json')
+
+COMPRESSORS = {
+    'gzip': lambda data, level: gzip.compress(data, level),
+    'deflate': lambda data, level: zlib.compress(data, level),
+}
+
+def compress_response(response):
+    """after_request hook: gzip or deflate bodies of at least
+    COMPRESS_MIN_SIZE bytes for clients that accept it. Streamed responses
+    are left alone."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(tuple(COMPRESSORS))
+    if encoding is None:
+        return response
+    response.set_data(COMPRESSORS[encoding](data, current_app.config['COMPRESS_LEVEL']))
+    response.headers['Content-Encoding'] = encoding
+    # A strong ETag must differ between encodings of the same resource.
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
@@ -1,89 +1,276 @@
-from flask import Blueprint, jsonify, request, render_template
+import csv, json
+from collections import OrderedDict
+from flask import Blueprint, Response, request, render_template, current_app, stream_with_context
 from sqlalchemy import exc
 from project.api.models import User
-from project.api.utils import authenticate, is_admin
+from project.api.utils import authenticate, read_only, is_admin, hashing_unavailable, encode_cursor, decode_cursor, \
+    create_user, UserExists, compute_etag, is_not_modified, not_modified, cacheable, encode_search_cursor, \
+    decode_search_cursor
+from project.api.hashing import HashingUnavailable
+from project.api.bulk import BULK_FORMATS, iter_rows, import_users
+from project.api.serialization import json_response, compress_response
+from project.api.queries import PUBLIC_USER_FIELDS, get_user_public, get_users_public, list_users, search_users, \
+    fuzzy_search_users
 from project import db
 
 users_blueprint = Blueprint('users', __name__,template_folder='./templates')
+users_blueprint.after_request(compress_response)
 
 @users_blueprint.route('/users', methods=['POST'])
 @authenticate
-def add_user(resp):
-    if not is_admin(resp):
+def add_user(principal):
+    if not is_admin(principal):
         response_object = {
             'status': 'error',
             'message': 'You do not have permission to do that.'
         }
-        return jsonify(response_object), 401
+        return json_response(response_object), 401
     post_data = request.get_json()
     if not post_data:
         response_object = {'status': 'fail', 'message':'Invalid payload'}
-        return jsonify(response_object), 400
+        return json_response(response_object), 400
     username = post_data.get('username')
     email = post_data.get('email')
     password = post_data.get('password')
     if not username or not email or not password:
         response_object = {'status':'fail', 'message':'Invalid payload keys'}
-        return jsonify(response_object), 400
+        return json_response(response_object), 400
     try:
-        user = User.query.filter_by(email=email).first()
-        if not user:
-            db.session.add(User(username=username, email=email, password=password))
-            db.session.commit()
-            response_object = {
-                'status':'success',
-                'message':f'{email} was added!'
-            }
-            return jsonify(response_object), 201
-        else:
-            response_object = {
-                'status':'fail',
-                'message':'User already exists'
-            }
-            return jsonify(response_object), 400
+        create_user(username, email, password)
+        response_object = {
+            'status':'success',
+            'message':f'{email} was added!'
+        }
+        return json_response(response_object), 201
+    except UserExists as e:
+        response_object = {
+            'status':'fail',
+            'message':'User already exists',
+            'conflict':e.field
+        }
+        return json_response(response_object), 400
+    except HashingUnavailable:
+        db.session.rollback()
+        return hashing_unavailable()
     except exc.IntegrityError as e:
         db.session.rollback()
         response_object = {
             'status': 'fail',
             'message': 'Unknown error'
         }
-        return jsonify(response_object), 400
+        return json_response(response_object), 400
+
+@users_blueprint.route('/users/bulk', methods=['POST'])
+@authenticate
+def add_users_bulk(principal):
+    if not is_admin(principal):
+        response_object = {
+            'status': 'error',
+            'message': 'You do not have permission to do that.'
+        }
+        return json_response(response_object), 401
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'jsonl')
+    if fmt not in BULK_FORMATS:
+        response_object = {'status':'fail', 'message':'Invalid import format'}
+        return json_response(response_object), 400
+    rows = list(iter_rows(request.get_data(as_text=True).splitlines(), fmt))
+    if not rows or len(rows) > current_app.config.get('BULK_IMPORT_MAX_ROWS'):
+        response_object = {'status':'fail', 'message':'Invalid payload'}
+        return json_response(response_object), 400
+    try:
+        results = list(import_users(rows))
+    except HashingUnavailable:
+        return hashing_unavailable()
+    created = sum(1 for result in results if result['status'] == 'created')
+    response_object = {
+        'status':'success',
+        'data':{
+            'created':created,
+            'failed':len(results) - created,
+            'results':results
+        }
+    }
+    return json_response(response_object), 200
 
 @users_blueprint.route('/users/<user_id>', methods=['GET'])
+@read_only
 def get_single_user(user_id):
     response_object = {'status':'fail','message':'User does not exist'}
     try:
-        user = User.query.filter_by(id=int(user_id)).first()
+        user = get_user_public(int(user_id))
         if not user:
-            return jsonify(response_object),404
+            return json_response(response_object),404
+        etag = compute_etag(PUBLIC_USER_FIELDS, user['id'], user['updated_at'])
+        if is_not_modified(etag, user['updated_at']):
+            return not_modified(etag, user['updated_at'])
         response_object = {
             'status':'success',
-            'data': {
-                'username':user.username,
-                'email':user.email,
-                'created_at': user.created_at
-            }
+            'data': serialize_user(user)
         }
-        return jsonify(response_object),200
+        return cacheable(json_response(response_object), etag, user['updated_at']),200
     except ValueError:
-        return jsonify(response_object),404
+        return json_response(response_object),404
+
+def serialize_user(user):
+    """Public fields of a read model row."""
+    return {field: user[field] for field in PUBLIC_USER_FIELDS}
+
+def get_users_by_ids(ids):
+    response_object = {'status':'fail', 'message':'Invalid query parameters'}
+    try:
+        ids = list(OrderedDict.fromkeys(int(user_id) for user_id in ids.split(',')))
+    except ValueError:
+        return json_response(response_object), 400
+    limit = current_app.config.get('USERS_BATCH_MAX_IDS')
+    if len(ids) > limit:
+        response_object['message'] = f'At most {limit} ids per request'
+        return json_response(response_object), 400
+    rows = get_users_public(ids)
+    etag = compute_etag(PUBLIC_USER_FIELDS, ids, sorted((row['id'], row['updated_at']) for row in rows.values()))
+    if is_not_modified(etag):
+        return not_modified(etag)
+    response_object = {
+        'status':'success',
+        'data':{
+            'users':[serialize_user(rows[user_id]) for user_id in ids if user_id in rows],
+            'missing':[user_id for user_id in ids if user_id not in rows]
+        }
+    }
+    return cacheable(json_response(response_object), etag)
 
 @users_blueprint.route('/users', methods=['GET'])
+@read_only
 def get_all_users():
-    users = User.query.order_by(User.created_at.desc()).all()
-    users_list = []
-    for user in users:
-        user_object = {
-            'id':user.id,
-            'username':user.username,
-            'email':user.email,
-            'created_at':user.created_at
+    if request.args.get('ids'):
+        return get_users_by_ids(request.args['ids'])
+    response_object = {'status':'fail', 'message':'Invalid query parameters'}
+    try:
+        limit = int(request.args.get('limit', current_app.config.get('USERS_PAGE_DEFAULT_LIMIT')))
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        limit = min(limit, current_app.config.get('USERS_PAGE_MAX_LIMIT'))
+        fields = PUBLIC_USER_FIELDS
+        if request.args.get('fields'):
+            fields = tuple(request.args['fields'].split(','))
+            if not set(fields) <= set(PUBLIC_USER_FIELDS):
+                raise ValueError('unknown field')
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor = decode_cursor(cursor)
+    except ValueError:
+        return json_response(response_object), 400
+    rows = list_users(fields, limit + 1, cursor)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    # A page is fully determined by its rows' versions; a row added,
+    # removed or changed anywhere in the page changes the ETag.
+    etag = compute_etag(fields, [(row['id'], row['updated_at']) for row in rows], next_cursor)
+    if is_not_modified(etag):
+        return not_modified(etag)
+    users_list = [{field: row[field] for field in fields} for row in rows]
+    response_object = {
+        'status':'success',
+        'data':{
+            'users':users_list,
+            'next_cursor':next_cursor
+        }
+    }
+    return cacheable(json_response(response_object), etag)
+
+@users_blueprint.route('/users/search', methods=['GET'])
+@authenticate
+@read_only
+def find_users(principal):
+    if not is_admin(principal):
+        response_object = {
+            'status': 'error',
+            'message': 'You do not have permission to do that.'
         }
-        users_list.append(user_object)
+        return json_response(response_object), 401
+    response_object = {'status':'fail', 'message':'Invalid query parameters'}
+    q = request.args.get('q', '').strip()
+    fuzzy = request.args.get('fuzzy', '').lower() in ('1', 'true')
+    try:
+        if not q:
+            raise ValueError('q is required')
+        limit = int(request.args.get('limit', current_app.config.get('USERS_SEARCH_DEFAULT_LIMIT')))
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        limit = min(limit, current_app.config.get('USERS_SEARCH_MAX_LIMIT'))
+        cursor = request.args.get('cursor')
+        if cursor:
+            if fuzzy:
+                raise ValueError('fuzzy results are not paginated')
+            cursor = decode_search_cursor(cursor)
+    except ValueError:
+        return json_response(response_object), 400
+    min_length = current_app.config.get('USERS_SEARCH_FUZZY_MIN_LENGTH')
+    if fuzzy and len(q) < min_length:
+        response_object['message'] = f'Fuzzy search needs at least {min_length} characters'
+        return json_response(response_object), 400
+    next_cursor = None
+    if fuzzy:
+        rows = fuzzy_search_users(q, limit)
+    else:
+        rows = search_users(q, limit + 1, cursor)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_search_cursor(rows[-1]['search_key'], rows[-1]['id'])
     response_object = {
         'status':'success',
         'data':{
-            'users':users_list
+            'users':[serialize_user(row) for row in rows],
+            'next_cursor':next_cursor
         }
     }
-    return jsonify(response_object)
+    return json_response(response_object), 200
+
+EXPORT_USER_FIELDS = ('id', 'username', 'email', 'active', 'admin', 'created_at')
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+class _Echo:
+    """File-like object that hands csv.writer rows straight back."""
+    def write(self, value):
+        return value
+
+def _export_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+@users_blueprint.route('/users/export', methods=['GET'])
+@authenticate
+def export_users(principal):
+    if not is_admin(principal):
+        response_object = {
+            'status': 'error',
+            'message': 'You do not have permission to do that.'
+        }
+        return json_response(response_object), 401
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_MIMETYPES:
+        response_object = {'status':'fail', 'message':'Invalid export format'}
+        return json_response(response_object), 400
+    # A server-side cursor plus yield_per keeps memory flat however large the
+    # table is; rows are written out as soon as each batch arrives.
+    query = db.session.query(*[getattr(User, field) for field in EXPORT_USER_FIELDS]) \
+        .order_by(User.id) \
+        .execution_options(stream_results=True) \
+        .yield_per(current_app.config.get('USERS_EXPORT_BATCH_SIZE'))
+
+    def generate_ndjson():
+        for row in query:
+            yield json.dumps({field: _export_value(value) for field, value in zip(EXPORT_USER_FIELDS, row)}) + '\n'
+
+    def generate_csv():
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_USER_FIELDS)
+        for row in query:
+            yield writer.writerow([_export_value(value) for value in row])
+
+    generate = generate_ndjson if export_format == 'ndjson' else generate_csv
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename=users.{export_format}'}
+    )
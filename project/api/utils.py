@@ -1,6 +1,10 @@
+import base64, datetime, hashlib, json
 from functools import wraps
-from flask import request, jsonify
-from project.api.models import User
+from flask import current_app, request, g
+from sqlalchemy import exc
+from project.api.models import RefreshToken, User, normalize_email
+from project.api.serialization import COMPRESSORS, json_response
+from project import db, denylist, principals, rate_limiter, taken_identities
 
 def authenticate(f):
     @wraps(f)
@@ -14,18 +18,259 @@ def authenticate(f):
         if not auth_header:
             response_object['message'] = 'Provide a valid auth token'
             code = 403
-            return jsonify(response_object)
+            return json_response(response_object)
         auth_token = auth_header.split(" ")[1]
-        resp = User.decode_auth_token(auth_token)
-        if isinstance(resp, str):
-            response_object['message'] = resp
-            return jsonify(response_object), code
-        user = User.query.filter_by(id=resp).first()
-        if not user or not user.active:
-            return jsonify(response_object), code
-        return f(resp, *args, **kwargs)
+        claims = verify_token(auth_token)
+        if isinstance(claims, str):
+            response_object['message'] = claims
+            return json_response(response_object), code
+        g.auth_claims = claims
+        resp = claims['sub']
+        principal = principals.get(resp)
+        if principal is None:
+            user = from_replica(User.query.filter_by(id=resp).first, resp)
+            if not user and g.get('replica_bind'):
+                # The user may be newer than the replica; the primary decides.
+                user = User.query.filter_by(id=resp).first()
+            if not user:
+                return json_response(response_object), code
+            g.current_user = user
+            principal = principals.add(user)
+        if not principal.active:
+            return json_response(response_object), code
+        g.principal = principal
+        return f(principal, *args, **kwargs)
     return decorated_function
 
-def is_admin(user_id):
-    user = User.query.filter_by(id=user_id).first()
-    return user.admin
\ No newline at end of file
+def verify_token(auth_token):
+    """Returns the claims of a valid, unrevoked token, or an error message."""
+    claims = User.decode_auth_claims(auth_token)
+    if isinstance(claims, str):
+        return claims
+    # Tokens issued before revocation existed carry no jti.
+    if 'jti' in claims and denylist.is_revoked(claims['jti']):
+        return 'Token revoked. Please log in again.'
+    return claims
+
+def load_principals(user_ids):
+    """Returns {user_id: Principal} for those of user_ids that exist, taking
+    what it can from the principal cache and the rest from one IN query."""
+    found = {}
+    for user_id in user_ids:
+        principal = principals.get(user_id)
+        if principal is not None:
+            found[user_id] = principal
+    missing = set(user_ids) - set(found)
+    if missing:
+        query = db.session.query(User.id, User.active, User.admin).filter(User.id.in_(missing))
+        rows = from_replica(query.all)
+        if len(rows) < len(missing) and g.get('replica_bind'):
+            rows = query.all()
+        for row in rows:
+            found[row.id] = principals.add(row)
+    return found
+
+def from_replica(read, user_id=None):
+    """Calls read() against a read replica, or against the primary if
+    user_id wrote recently. Reads are retried on the primary when the
+    replica fails, which also takes it out of rotation."""
+    try:
+        with db.read_replica(user_id):
+            return read()
+    except exc.OperationalError:
+        if not g.get('replica_bind'):
+            raise
+        db.session.rollback()
+        g.replica_bind = None
+    return read()
+
+def read_only(f):
+    """Serves a view that only reads from a read replica; see from_replica."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        principal = g.get('principal')
+        return from_replica(lambda: f(*args, **kwargs), principal.id if principal else None)
+    return decorated_function
+
+def revoke_token(claims):
+    """Adds a decoded token to the denylist until it would have expired,
+    and ends the refresh token family it was issued with."""
+    if 'sid' in claims:
+        RefreshToken.end_family(claims['sid'])
+        db.session.commit()
+    if 'jti' in claims:
+        denylist.revoke(claims['jti'], datetime.datetime.utcfromtimestamp(claims['exp']))
+
+def get_current_user():
+    """Returns the authenticated User row, loading it only if authenticate
+    was answered from the principal cache."""
+    if g.get('current_user') is None:
+        g.current_user = User.query.filter_by(id=g.principal.id).first()
+    return g.current_user
+
+def is_admin(principal):
+    return principal.admin
+
+def hashing_unavailable():
+    response_object = {
+        'status': 'error',
+        'message': 'Service busy. Please try again.'
+    }
+    return json_response(response_object), 503, {'Retry-After': '1'}
+
+def rate_limited(action, email=None):
+    """Counts an attempt at action ('login' or 'register') against the
+    client's IP and, when given, the email. Returns a 429 response if either
+    is over its <ACTION>_RATE_LIMIT_PER_IP / _PER_EMAIL limit, otherwise
+    None. Call it before any query or password hashing."""
+    config = current_app.config
+    if not config['RATE_LIMIT_ENABLED']:
+        return None
+    prefix = action.upper()
+    retry_after = rate_limiter.hit(f'{action}:ip:{request.remote_addr}', config[f'{prefix}_RATE_LIMIT_PER_IP'])
+    if isinstance(email, str):
+        retry_after = max(retry_after, rate_limiter.hit(
+            f'{action}:email:{normalize_email(email)}', config[f'{prefix}_RATE_LIMIT_PER_EMAIL']))
+    if not retry_after:
+        return None
+    response_object = {
+        'status': 'error',
+        'message': 'Too many attempts. Please try again later.'
+    }
+    return json_response(response_object, 429, {'Retry-After': str(retry_after)})
+
+def compute_etag(*parts):
+    """A strong ETag for a representation fully determined by parts."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def is_not_modified(etag, last_modified=None):
+    """True if the request's If-None-Match, or failing that its
+    If-Modified-Since, shows the client already has this representation."""
+    if request.if_none_match:
+        # Compressed responses carry the ETag with the encoding appended.
+        return any(request.if_none_match.contains_weak(etag + suffix)
+                   for suffix in [''] + [f'-{encoding}' for encoding in COMPRESSORS])
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def cacheable(response, etag, last_modified=None):
+    """Adds validators and Cache-Control so clients can revalidate."""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = current_app.config['USERS_CACHE_CONTROL']
+    return response
+
+def not_modified(etag, last_modified=None):
+    return cacheable(current_app.response_class(status=304), etag, last_modified)
+
+def encode_cursor(created_at, user_id):
+    """Returns an opaque keyset cursor pointing just after (created_at, user_id)."""
+    raw = json.dumps([created_at.strftime('%Y-%m-%dT%H:%M:%S.%f'), user_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    try:
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return datetime.datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S.%f'), int(user_id)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor.')
+
+def encode_search_cursor(search_key, user_id):
+    """Returns an opaque cursor pointing just after a search result."""
+    raw = json.dumps([search_key, user_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_search_cursor(cursor):
+    """Inverse of encode_search_cursor; raises ValueError for malformed cursors."""
+    try:
+        search_key, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if not isinstance(search_key, str):
+            raise ValueError('Invalid cursor.')
+        return search_key, int(user_id)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor.')
+
+class UserExists(Exception):
+    """Raised by create_user; field names the unique column that conflicted."""
+    def __init__(self, field):
+        super().__init__(f'{field} is already taken')
+        self.field = field
+
+def conflicting_field(error):
+    """Returns 'username' or 'email' if error is a unique violation on that
+    column, otherwise None."""
+    orig = error.orig
+    if getattr(orig, 'pgcode', None) is not None:
+        # psycopg2 reports the violated constraint, e.g. users_email_key.
+        if orig.pgcode != '23505':
+            return None
+        detail = orig.diag.constraint_name or ''
+    else:
+        # SQLite: "UNIQUE constraint failed: users.email"
+        detail = str(orig)
+        if 'UNIQUE' not in detail.upper():
+            return None
+    for field in ('username', 'email'):
+        if field in detail:
+            return field
+    return None
+
+def create_user(username, email, password):
+    """Inserts a user with a single INSERT and returns its id.
+
+    Instead of querying for duplicates first, the unique constraints decide
+    and the violated one is reported through UserExists. Identities already
+    known to be taken are rejected before the password is hashed."""
+    email = normalize_email(email)
+    field = taken_identities.find(username=username, email=email)
+    if field:
+        raise UserExists(field)
+    user = User(username=username, email=email, password=password)
+    db.session.add(user)
+    try:
+        db.session.flush()
+        user_id = user.id
+        db.session.commit()
+    except exc.IntegrityError as e:
+        db.session.rollback()
+        field = conflicting_field(e)
+        if field is None:
+            raise
+        taken_identities.add(field, username if field == 'username' else email)
+        raise UserExists(field)
+    taken_identities.add('username', username)
+    taken_identities.add('email', email)
+    return user_id
+
+class InvalidRefreshToken(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+def rotate_refresh_token(token):
+    """Exchanges a refresh token for a new one of the same family and
+    returns (user_id, family, new token). A token that was already exchanged means
+    two parties hold the family, so its remaining tokens are revoked."""
+    now = datetime.datetime.utcnow()
+    row = db.session.query(
+        RefreshToken.id, RefreshToken.user_id, RefreshToken.family,
+        RefreshToken.expires_at, RefreshToken.used_at, User.active
+    ).join(User, User.id == RefreshToken.user_id) \
+        .filter(RefreshToken.token_hash == RefreshToken.hash_token(token)).first()
+    if row is None or not row.active:
+        raise InvalidRefreshToken('Invalid token. Please log in again.')
+    if row.expires_at <= now:
+        raise InvalidRefreshToken('Refresh token expired. Please log in again.')
+    # Compare-and-set, so of two concurrent exchanges only one succeeds.
+    claimed = row.used_at is None and RefreshToken.query.filter_by(id=row.id, used_at=None) \
+        .update({'used_at': now}, synchronize_session=False)
+    if not claimed:
+        RefreshToken.end_family(row.family, now)
+        db.session.commit()
+        raise InvalidRefreshToken('Refresh token reused. Please log in again.')
+    new_token = RefreshToken.issue(row.user_id, row.family)
+    db.session.commit()
+    return row.user_id, row.family, new_token
@@ -5,10 +5,78 @@ class BaseConfig:
     DEBUG = False
     TESTING = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_POOL_SIZE = int(os.environ.get('SQLALCHEMY_POOL_SIZE', 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', 10))
+    SQLALCHEMY_POOL_TIMEOUT = int(os.environ.get('SQLALCHEMY_POOL_TIMEOUT', 30))
+    SQLALCHEMY_POOL_RECYCLE = int(os.environ.get('SQLALCHEMY_POOL_RECYCLE', 1800))
+    SQLALCHEMY_POOL_PRE_PING = os.environ.get('SQLALCHEMY_POOL_PRE_PING', '1') == '1'
+    SQLALCHEMY_STATEMENT_TIMEOUT_MS = int(os.environ.get('SQLALCHEMY_STATEMENT_TIMEOUT_MS', 0)) or None
+    SQLALCHEMY_BINDS = {
+        f'replica_{n}': url
+        for n, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')))
+    }
+    SQLALCHEMY_REPLICA_BINDS = sorted(SQLALCHEMY_BINDS)
+    REPLICA_EJECT_SECONDS = int(os.environ.get('REPLICA_EJECT_SECONDS', 30))
+    REPLICA_READ_YOUR_WRITES_SECONDS = int(os.environ.get('REPLICA_READ_YOUR_WRITES_SECONDS', 5))
     SECRET_KEY = os.environ.get('SECRET_KEY')
+    PASSWORD_SCHEME = os.environ.get('PASSWORD_SCHEME', 'bcrypt')
     BCRYPT_LOG_ROUNDS = 13
-    TOKEN_EXPIRATION_DAYS = 30
-    TOKEN_EXPIRATION_SECONDS = 0
+    SCRYPT_LOG_N = 14
+    SCRYPT_R = 8
+    SCRYPT_P = 1
+    TOKEN_EXPIRATION_DAYS = 0
+    TOKEN_EXPIRATION_SECONDS = int(os.environ.get('TOKEN_EXPIRATION_SECONDS', 900))
+    INTROSPECT_MAX_TOKENS = int(os.environ.get('INTROSPECT_MAX_TOKENS', 100))
+    JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
+    JWT_KEY_DIR = os.environ.get('JWT_KEY_DIR')
+    JWT_SIGNING_KID = os.environ.get('JWT_SIGNING_KID')
+    JWKS_MAX_AGE = int(os.environ.get('JWKS_MAX_AGE', 3600))
+    REFRESH_TOKEN_EXPIRATION_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRATION_DAYS', 30))
+    PRINCIPAL_CACHE_BACKEND = 'project.api.cache.MemoryBackend'
+    PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 10000))
+    PRINCIPAL_CACHE_TTL = int(os.environ.get('PRINCIPAL_CACHE_TTL', 30))
+    REGISTRATION_TAKEN_CACHE_BACKEND = 'project.api.cache.MemoryBackend'
+    REGISTRATION_TAKEN_CACHE_SIZE = 10000
+    REGISTRATION_TAKEN_CACHE_TTL = 300
+    VERIFIED_TOKEN_CACHE_BACKEND = 'project.api.cache.MemoryBackend'
+    VERIFIED_TOKEN_CACHE_SIZE = int(os.environ.get('VERIFIED_TOKEN_CACHE_SIZE', 10000))
+    TOKEN_DENYLIST_CAPACITY = int(os.environ.get('TOKEN_DENYLIST_CAPACITY', 100000))
+    TOKEN_DENYLIST_ERROR_RATE = float(os.environ.get('TOKEN_DENYLIST_ERROR_RATE', 0.001))
+    TOKEN_DENYLIST_REFRESH_SECONDS = int(os.environ.get('TOKEN_DENYLIST_REFRESH_SECONDS', 5))
+    TOKEN_DENYLIST_PRUNE_SECONDS = int(os.environ.get('TOKEN_DENYLIST_PRUNE_SECONDS', 3600))
+    TOKEN_DENYLIST_REFRESH_OVERLAP = int(os.environ.get('TOKEN_DENYLIST_REFRESH_OVERLAP', 1000))
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_BACKEND = 'project.api.ratelimit.MemoryWindows'
+    RATE_LIMIT_SIZE = int(os.environ.get('RATE_LIMIT_SIZE', 100000))
+    RATE_LIMIT_WINDOW = int(os.environ.get('RATE_LIMIT_WINDOW', 60))
+    LOGIN_RATE_LIMIT_PER_IP = int(os.environ.get('LOGIN_RATE_LIMIT_PER_IP', 30))
+    LOGIN_RATE_LIMIT_PER_EMAIL = int(os.environ.get('LOGIN_RATE_LIMIT_PER_EMAIL', 10))
+    REGISTER_RATE_LIMIT_PER_IP = int(os.environ.get('REGISTER_RATE_LIMIT_PER_IP', 10))
+    REGISTER_RATE_LIMIT_PER_EMAIL = int(os.environ.get('REGISTER_RATE_LIMIT_PER_EMAIL', 5))
+    HASHING_POOL_KIND = os.environ.get('HASHING_POOL_KIND', 'thread')
+    HASHING_POOL_WORKERS = int(os.environ.get('HASHING_POOL_WORKERS', os.cpu_count() or 1))
+    HASHING_POOL_QUEUE_SIZE = int(os.environ.get('HASHING_POOL_QUEUE_SIZE', 16))
+    HASHING_TIMEOUT = 30
+    USERS_PAGE_DEFAULT_LIMIT = 50
+    USERS_PAGE_MAX_LIMIT = 500
+    USERS_BATCH_MAX_IDS = 100
+    USERS_CACHE_CONTROL = 'private, no-cache'
+    USERS_SEARCH_DEFAULT_LIMIT = 20
+    USERS_SEARCH_MAX_LIMIT = 100
+    USERS_SEARCH_FUZZY_MIN_LENGTH = 3
+    JSON_ENCODER = os.environ.get('JSON_ENCODER', 'auto')
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    USERS_EXPORT_BATCH_SIZE = 1000
+    BULK_IMPORT_BATCH_SIZE = 1000
+    # Per HTTP request; larger files go through `manage.py import_users`.
+    BULK_IMPORT_MAX_ROWS = int(os.environ.get('BULK_IMPORT_MAX_ROWS', 100))
+    BULK_IMPORT_PROCESSES = int(os.environ.get('BULK_IMPORT_PROCESSES', 0)) or None
+    METRICS_ENABLED = True
+    SQL_DIAGNOSTICS = os.environ.get('SQL_DIAGNOSTICS') == '1'
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+    SLOW_QUERY_LOG_VALUES = os.environ.get('SLOW_QUERY_LOG_VALUES') == '1'
+    REPEATED_QUERY_THRESHOLD = 1
 
 class DevelopmentConfig(BaseConfig):
     """Development configuration"""
@@ -22,6 +90,9 @@ class TestingConfig(BaseConfig):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_TEST_URL')
+    SQLALCHEMY_POOL_SIZE = 2
+    SQLALCHEMY_MAX_OVERFLOW = 2
+    SQLALCHEMY_POOL_TIMEOUT = 5
     BCRYPT_LOG_ROUNDS = 4
     TOKEN_EXPIRATION_DAYS = 0
     TOKEN_EXPIRATION_SECONDS = 3
@@ -30,4 +101,8 @@ class TestingConfig(BaseConfig):
 class ProductionConfig(BaseConfig):
     """Production configuration"""
     DEBUG = False
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    SQLALCHEMY_POOL_SIZE = int(os.environ.get('SQLALCHEMY_POOL_SIZE', 10))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', 20))
+    SQLALCHEMY_POOL_TIMEOUT = int(os.environ.get('SQLALCHEMY_POOL_TIMEOUT', 5))
+    SQLALCHEMY_STATEMENT_TIMEOUT_MS = int(os.environ.get('SQLALCHEMY_STATEMENT_TIMEOUT_MS', 5000)) or None
\ No newline at end of file
@@ -1,16 +1,49 @@
+from contextlib import contextmanager
+from flask import _request_ctx_stack, g
+from flask.testing import FlaskClient
 from flask_testing import TestCase
-from project import create_app,db
+from project import create_app,db,denylist,principals,rate_limiter,taken_identities,verified_tokens
+from project.tests.utils import count_queries
 app = create_app()
 
+class RequestClient(FlaskClient):
+    """Test client that starts every request with an empty g. flask_testing
+    keeps one app context open for the whole test, so g would otherwise
+    carry state between requests that no production request could see."""
+    def open(self, *args, **kwargs):
+        # Finish a request kept open by `with client:` before clearing its g.
+        top = _request_ctx_stack.top
+        if top is not None and top.preserved:
+            top.pop(top._preserved_exc)
+        g.__dict__.clear()
+        return super().open(*args, **kwargs)
+
+app.test_client_class = RequestClient
+
 class BaseTestCase(TestCase):
     def create_app(self):
         app.config.from_object('project.config.TestingConfig')
         return app
 
     def setUp(self):
+        principals.clear()
+        taken_identities.clear()
+        verified_tokens.clear()
+        rate_limiter.clear()
         db.create_all()
         db.session.commit()
+        denylist.clear()
+        denylist.refresh()
 
     def tearDown(self):
         db.session.remove()
-        db.drop_all()
\ No newline at end of file
+        db.drop_all()
+
+    @contextmanager
+    def assertNumQueries(self, num):
+        with count_queries() as statements:
+            yield statements
+        self.assertEqual(
+            len(statements), num,
+            f'{len(statements)} queries executed, {num} expected:\n' + '\n'.join(statements)
+        )
\ No newline at end of file
@@ -1,9 +1,9 @@
-import json,time
+import datetime,json,time
 
-from project import db
-from project.api.models import User
+from project import db, hasher, principals
+from project.api.models import RefreshToken, User
 from project.tests.base import BaseTestCase
-from project.tests.utils import add_user
+from project.tests.utils import add_user, login_test_user
 
 class TestAuthBlueprint(BaseTestCase):
     def test_user_registration(self):
@@ -292,4 +292,207 @@ class TestAuthBlueprint(BaseTestCase):
             self.assertTrue(data['status'] == 'error')
             self.assertTrue(
                 data['message'] == 'Something went wrong. Please contact us.')
-            self.assertEqual(response.status_code, 401)            
\ No newline at end of file
+            self.assertEqual(response.status_code, 401)            
+    def test_user_status_loads_user_once(self):
+        add_user('test', 'test@test.com', 'test')
+        with self.client:
+            resp_login = self.client.post(
+                '/auth/login',
+                data=json.dumps(dict(
+                    email='test@test.com',
+                    password='test'
+                )),
+                content_type='application/json'
+            )
+            headers = dict(
+                Authorization='Bearer ' + json.loads(resp_login.data.decode())['auth_token']
+            )
+            with self.assertNumQueries(1):
+                response = self.client.get('/auth/status', headers=headers)
+            self.assertEqual(response.status_code, 200)
+
+    def test_user_registration_single_insert(self):
+        with self.client:
+            # The user row and its refresh token.
+            with self.assertNumQueries(2):
+                response = self.client.post(
+                    '/auth/register',
+                    data=json.dumps(dict(username='juneau', email='juneau@dog.com', password='password123')),
+                    content_type='application/json'
+                )
+            self.assertEqual(response.status_code, 201)
+
+    def test_user_registration_duplicate_reports_conflict(self):
+        add_user('test', 'test@test.com', 'test')
+        with self.client:
+            response = self.client.post(
+                '/auth/register',
+                data=json.dumps(dict(username='michael', email='test@test.com', password='test')),
+                content_type='application/json'
+            )
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data['conflict'], 'email')
+            # the conflict is remembered, so a retry skips hashing and the database
+            with self.assertNumQueries(0):
+                response = self.client.post(
+                    '/auth/register',
+                    data=json.dumps(dict(username='michael', email='test@test.com', password='test')),
+                    content_type='application/json'
+                )
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Sorry. That user already exists.', data['message'])
+            self.assertEqual(data['conflict'], 'email')
+
+    def test_user_registration_duplicate_email_in_other_case(self):
+        add_user('test', 'test@test.com', 'test')
+        with self.client:
+            response = self.client.post(
+                '/auth/register',
+                data=json.dumps(dict(username='michael', email=' Test@TEST.com', password='test')),
+                content_type='application/json'
+            )
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data['conflict'], 'email')
+
+    def test_login_ignores_email_case(self):
+        add_user('test', 'Test@Test.com', 'test')
+        with self.client:
+            with self.assertNumQueries(1):
+                user = User.find_by_email('TEST@test.com')
+            response = self.client.post(
+                '/auth/login',
+                data=json.dumps(dict(email='TEST@test.COM', password='test')),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(user.email, 'test@test.com')
+
+    def login(self):
+        add_user('test', 'test@test.com', 'test')
+        response = self.client.post(
+            '/auth/login',
+            data=json.dumps(dict(email='test@test.com', password='test')),
+            content_type='application/json'
+        )
+        return json.loads(response.data.decode())
+
+    def refresh(self, refresh_token):
+        response = self.client.post(
+            '/auth/refresh',
+            data=json.dumps(dict(refresh_token=refresh_token)),
+            content_type='application/json'
+        )
+        return response, json.loads(response.data.decode())
+
+    def test_refresh_rotates_tokens(self):
+        tokens = self.login()
+        completed = hasher.stats()['completed']
+        with self.assertNumQueries(3) as statements:
+            response, data = self.refresh(tokens['refresh_token'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status'], 'success')
+        self.assertNotEqual(data['refresh_token'], tokens['refresh_token'])
+        self.assertEqual([s.split()[0] for s in statements], ['SELECT', 'UPDATE', 'INSERT'])
+        self.assertEqual(hasher.stats()['completed'], completed)
+        response = self.client.get('/auth/status', headers=dict(Authorization='Bearer ' + data['auth_token']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RefreshToken.query.count(), 2)
+
+    def test_refresh_token_reuse_revokes_family(self):
+        tokens = self.login()
+        _, rotated = self.refresh(tokens['refresh_token'])
+        response, data = self.refresh(tokens['refresh_token'])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data['message'], 'Refresh token reused. Please log in again.')
+        response, data = self.refresh(rotated['refresh_token'])
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_ends_refresh_tokens(self):
+        tokens = self.login()
+        headers = dict(Authorization='Bearer ' + tokens['auth_token'])
+        self.assertEqual(self.client.get('/auth/logout', headers=headers).status_code, 200)
+        response, data = self.refresh(tokens['refresh_token'])
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_after_refresh_ends_the_session(self):
+        tokens = self.login()
+        _, rotated = self.refresh(tokens['refresh_token'])
+        headers = dict(Authorization='Bearer ' + rotated['auth_token'])
+        self.assertEqual(self.client.get('/auth/logout', headers=headers).status_code, 200)
+        response, _ = self.refresh(rotated['refresh_token'])
+        self.assertEqual(response.status_code, 401)
+
+    def test_admin_revoke_ends_refresh_tokens(self):
+        tokens = self.login()
+        with self.client:
+            response = self.client.post(
+                '/auth/revoke', data=json.dumps(dict(token=tokens['auth_token'])),
+                content_type='application/json', headers=login_test_user(self.client)
+            )
+            self.assertEqual(response.status_code, 200)
+        response, _ = self.refresh(tokens['refresh_token'])
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_token_expired(self):
+        tokens = self.login()
+        RefreshToken.query.update({'expires_at': datetime.datetime.utcnow() - datetime.timedelta(seconds=1)})
+        db.session.commit()
+        response, data = self.refresh(tokens['refresh_token'])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data['message'], 'Refresh token expired. Please log in again.')
+
+    def test_refresh_token_inactive_user(self):
+        tokens = self.login()
+        User.query.update({'active': False})
+        db.session.commit()
+        response, data = self.refresh(tokens['refresh_token'])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data['message'], 'Invalid token. Please log in again.')
+
+    def test_refresh_invalid_payload(self):
+        response = self.client.post('/auth/refresh', data=json.dumps({}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response, data = self.refresh('invalid')
+        self.assertEqual(response.status_code, 401)
+
+    def introspect(self, tokens):
+        response = self.client.post(
+            '/auth/introspect',
+            data=json.dumps(dict(tokens=tokens)),
+            content_type='application/json'
+        )
+        return response, json.loads(response.data.decode())
+
+    def test_introspect_batch(self):
+        users = [add_user(f'user{n}', f'user{n}@test.com') for n in range(3)]
+        users[2].active = False
+        users[1].admin = True
+        db.session.commit()
+        tokens = [User.encode_auth_token(user.id).decode() for user in users]
+        revoked = User.encode_auth_token(users[0].id).decode()
+        self.client.get('/auth/logout', headers=dict(Authorization='Bearer ' + revoked))
+        principals.clear()
+        # one IN query for the users, plus confirming the revoked token's denylist hit
+        with self.assertNumQueries(2):
+            response, data = self.introspect(tokens + [revoked, 'invalid'])
+        self.assertEqual(response.status_code, 200)
+        results = data['data']
+        self.assertEqual([result['active'] for result in results], [True, True, False, False, False])
+        self.assertEqual((results[0]['user_id'], results[0]['admin']), (users[0].id, False))
+        self.assertTrue(results[1]['admin'])
+        self.assertEqual(results[0]['exp'], User.decode_auth_claims(tokens[0])['exp'])
+        self.assertEqual(results[3]['message'], 'Token revoked. Please log in again.')
+        self.assertEqual(results[4]['message'], 'Invalid token. Please log in again.')
+        # principals are cached now
+        with self.assertNumQueries(0):
+            self.introspect(tokens[:2])
+
+    def test_introspect_invalid_payload(self):
+        response, data = self.introspect('not a list')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['message'], 'Invalid payload.')
+        response, data = self.introspect(['token'] * (self.app.config['INTROSPECT_MAX_TOKENS'] + 1))
+        self.assertEqual(response.status_code, 400)
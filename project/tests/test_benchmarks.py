@@ -0,0 +1,36 @@
+import hashlib, unittest
+from unittest import mock
+
+from benchmarks.cases import build_suite, configured_schemes, scheme_label
+from benchmarks.runner import Suite, compare
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+class TestBenchmarkRunner(unittest.TestCase):
+    def test_suite_runs_selected_cases(self):
+        calls = []
+        suite = Suite()
+        suite.case('token.encode', lambda: calls.append('encode'))
+        suite.case('token.decode', lambda: calls.append('decode'), setup=lambda: calls.append('setup'))
+        results = suite.run(repeat=2, only=['decode'], report=lambda line: None)
+        self.assertEqual(list(results), ['token.decode'])
+        self.assertEqual(results['token.decode']['repeat'], 2)
+        self.assertEqual(calls, ['setup', 'decode'] * 3)
+
+    def test_compare_flags_slowdowns_over_threshold(self):
+        baseline = {'a': {'median': 1.0}, 'b': {'median': 1.0}, 'gone': {'median': 1.0}}
+        results = {'a': {'median': 1.1}, 'b': {'median': 1.5}, 'new': {'median': 9.0}}
+        self.assertEqual(compare(results, baseline, threshold=0.2), [('b', 1.0, 1.5, 1.5)])
+
+class TestBenchmarkCases(BaseTestCase):
+    def test_configured_schemes(self):
+        with mock.patch.object(hashlib, 'scrypt', create=True):
+            labels = [scheme_label(scheme) for scheme in configured_schemes()]
+        self.assertEqual(labels, ['bcrypt.4', 'bcrypt.13', 'scrypt.ln14.r8.p1'])
+
+    def test_every_route_has_a_case(self):
+        admin = add_user('bench_admin', 'bench_admin@example.com')
+        suite = build_suite(self.app, admin.id)
+        self.assertEqual(suite.uncovered, ['GET /metrics'])
+        results = suite.run(repeat=1, only=['route.GET /users/<user_id>'], report=lambda line: None)
+        self.assertEqual(list(results), ['route.GET /users/<user_id>'])
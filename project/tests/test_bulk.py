@@ -0,0 +1,106 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+from project import hasher
+from project.api.bulk import iter_rows, import_users
+from project.api.hashing import HashingUnavailable
+from project.api.models import User
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user, login_test_user, login_user
+
+class TestBulkImport(BaseTestCase):
+    def test_iter_rows_jsonl(self):
+        lines = ['{"username": "a", "email": "a@a.com", "password": "x"}', '', 'not json', '[1]']
+        rows = list(iter_rows(lines, 'jsonl'))
+        self.assertEqual(rows[0], (1, {'username': 'a', 'email': 'a@a.com', 'password': 'x'}))
+        self.assertEqual(rows[1:], [(2, None), (3, None)])
+
+    def test_iter_rows_csv(self):
+        lines = ['username,email,password', 'a,a@a.com,x']
+        rows = list(iter_rows(lines, 'csv'))
+        self.assertEqual(rows, [(1, {'username': 'a', 'email': 'a@a.com', 'password': 'x'})])
+
+    def test_import_users_in_batches(self):
+        add_user('taken', 'taken@test.com')
+        rows = list(enumerate([
+            dict(username='one', email='one@test.com', password='password123'),
+            dict(username='two', email='taken@test.com', password='password123'),
+            dict(username='three', email='three@test.com', password='password123'),
+            dict(username='three', email='other@test.com', password='password123'),
+            dict(username='four', email='four@test.com'),
+        ], 1))
+        with self.assertNumQueries(4), ProcessPoolExecutor(max_workers=2) as executor:
+            results = list(import_users(rows, batch_size=2, executor=executor))
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['created', 'duplicate', 'created', 'duplicate', 'invalid']
+        )
+        user = User.query.filter_by(username='three').first()
+        self.assertTrue(user.active)
+        self.assertFalse(user.admin)
+        self.assertTrue(hasher.verify_password(user.password, 'password123'))
+
+    def test_bulk_endpoint_jsonl(self):
+        payload = '\n'.join(json.dumps(row) for row in [
+            dict(username='one', email='one@test.com', password='password123'),
+            dict(username='test_user', email='two@test.com', password='password123'),
+        ])
+        with self.client:
+            auth_header = login_test_user(self.client)
+            response = self.client.post('/users/bulk', data=payload,
+                                        content_type='application/x-ndjson', headers=auth_header)
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(data['data']['created'], 1)
+            self.assertEqual(data['data']['failed'], 1)
+            self.assertEqual(data['data']['results'][1]['message'], 'User already exists')
+
+    def test_bulk_endpoint_csv(self):
+        payload = 'username,email,password\none,one@test.com,password123\n'
+        with self.client:
+            auth_header = login_test_user(self.client)
+            response = self.client.post('/users/bulk', data=payload,
+                                        content_type='text/csv', headers=auth_header)
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(data['data']['created'], 1)
+            self.assertTrue(User.query.filter_by(email='one@test.com').first())
+
+    def test_bulk_endpoint_too_many_rows(self):
+        self.app.config['BULK_IMPORT_MAX_ROWS'] = 1
+        payload = 'username,email,password\none,one@test.com,x\ntwo,two@test.com,x\n'
+        with self.client:
+            auth_header = login_test_user(self.client)
+            response = self.client.post('/users/bulk', data=payload,
+                                        content_type='text/csv', headers=auth_header)
+            self.assertEqual(response.status_code, 400)
+
+    def test_bulk_endpoint_returns_503_when_hashing_is_saturated(self):
+        payload = 'username,email,password\none,one@test.com,x\n'
+        with self.client:
+            auth_header = login_test_user(self.client)
+            with mock.patch.object(hasher, 'submit', side_effect=HashingUnavailable):
+                response = self.client.post('/users/bulk', data=payload,
+                                            content_type='text/csv', headers=auth_header)
+            self.assertEqual(response.status_code, 503)
+            self.assertIsNone(User.query.filter_by(email='one@test.com').first())
+
+    def test_bulk_endpoint_not_admin(self):
+        add_user('test', 'test@test.com', 'test')
+        with self.client:
+            response = self.client.post(
+                '/users/bulk', data='', content_type='text/csv', headers=login_user(self.client, password='test')
+            )
+            self.assertEqual(response.status_code, 401)
+
+    def test_import_normalizes_emails(self):
+        add_user('taken', 'taken@test.com')
+        rows = list(enumerate([
+            dict(username='one', email='One@Test.com', password='password123'),
+            dict(username='two', email='TAKEN@test.com', password='password123'),
+            dict(username='three', email='one@test.COM', password='password123'),
+        ], 1))
+        results = list(import_users(rows))
+        self.assertEqual([result['status'] for result in results], ['created', 'duplicate', 'duplicate'])
+        self.assertEqual(User.query.filter_by(username='one').first().email, 'one@test.com')
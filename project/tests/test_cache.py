@@ -0,0 +1,102 @@
+import calendar, datetime, json, time
+
+from flask import g
+from project import db, principals, verified_tokens
+from project.api.cache import MemoryBackend, VerifiedTokens
+from project.api.models import User
+from project.api.utils import authenticate
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user, login_user
+
+class TestMemoryBackend(BaseTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = MemoryBackend(maxsize=2, ttl=60)
+        cache.set(1, 'one')
+        cache.set(2, 'two')
+        cache.get(1)
+        cache.set(3, 'three')
+        self.assertEqual(cache.get(1), 'one')
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(3), 'three')
+
+    def test_entries_expire(self):
+        cache = MemoryBackend(maxsize=2, ttl=0.01)
+        cache.set(1, 'one')
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(len(cache), 0)
+
+class TestPrincipalCache(BaseTestCase):
+    def test_authenticate_uses_cached_principal(self):
+        user = add_user('test', 'test@test.com', 'test')
+        headers = login_user(self.client, password='test')
+        self.client.get('/auth/status', headers=headers)
+        with self.app.test_request_context(headers=headers):
+            g.__dict__.clear()
+            with self.assertNumQueries(0):
+                principal = authenticate(lambda principal: principal)()
+        self.assertEqual(principal.id, user.id)
+        # /auth/status still loads the row for its response, once.
+        with self.assertNumQueries(1):
+            response = self.client.get('/auth/status', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivating_user_invalidates_principal(self):
+        user = add_user('test', 'test@test.com', 'test')
+        with self.client:
+            headers = login_user(self.client, password='test')
+            self.client.get('/auth/status', headers=headers)
+            self.assertTrue(principals.get(user.id).active)
+            user.active = False
+            db.session.commit()
+            self.assertIsNone(principals.get(user.id))
+            response = self.client.get('/auth/status', headers=headers)
+            self.assertEqual(response.status_code, 401)
+
+    def test_promoting_user_invalidates_principal(self):
+        user = add_user('test', 'test@test.com', 'test')
+        with self.client:
+            headers = login_user(self.client, password='test')
+            self.client.get('/auth/status', headers=headers)
+            user.admin = True
+            db.session.commit()
+            response = self.client.post(
+                '/users',
+                data=json.dumps(dict(username='neil', email='neil@test.com', password='test')),
+                content_type='application/json',
+                headers=headers
+            )
+            self.assertEqual(response.status_code, 201)
+
+class TestVerifiedTokens(BaseTestCase):
+    def test_repeated_token_is_verified_once(self):
+        user = add_user('test', 'test@test.com', 'test')
+        token = User.encode_auth_token(user.id)
+        before = verified_tokens.stats()
+        self.assertEqual(User.decode_auth_token(token), user.id)
+        self.assertEqual(User.decode_auth_token(token), user.id)
+        after = verified_tokens.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_cached_token_still_expires(self):
+        user = add_user('test', 'test@test.com', 'test')
+        token = User.encode_auth_token(user.id)
+        claims = User.decode_auth_claims(token)
+        now = calendar.timegm(datetime.datetime.utcnow().utctimetuple())
+        # an entry the backend has not evicted yet
+        verified_tokens.backend.set(VerifiedTokens._key(token), dict(claims, exp=now - 1), ttl=60)
+        self.assertEqual(User.decode_auth_token(token), 'Signature expired. Please log in again.')
+
+    def test_invalid_tokens_are_not_cached(self):
+        self.assertEqual(User.decode_auth_token('invalid'), 'Invalid token. Please log in again.')
+        self.assertEqual(len(verified_tokens.backend), 0)
+
+    def test_size_is_configurable(self):
+        self.app.config['VERIFIED_TOKEN_CACHE_SIZE'] = 1
+        cache = VerifiedTokens(self.app)
+        exp = time.time() + 60
+        cache.add('one', {'sub': 1, 'exp': exp})
+        cache.add('two', {'sub': 2, 'exp': exp})
+        self.assertIsNone(cache.get('one'))
+        self.assertEqual(cache.get('two')['sub'], 2)
@@ -17,8 +17,9 @@ class TestDevelopmentConfig(TestCase):
             app.config['SQLALCHEMY_DATABASE_URI'] == os.environ.get('DATABASE_URL')
         )
         self.assertTrue(app.config['BCRYPT_LOG_ROUNDS'] == 4)
-        self.assertTrue(app.config['TOKEN_EXPIRATION_DAYS'] == 30)
-        self.assertTrue(app.config['TOKEN_EXPIRATION_SECONDS'] == 0)
+        self.assertTrue(app.config['TOKEN_EXPIRATION_DAYS'] == 0)
+        self.assertTrue(app.config['TOKEN_EXPIRATION_SECONDS'] == 900)
+        self.assertTrue(app.config['REFRESH_TOKEN_EXPIRATION_DAYS'] == 30)
 
 class TestTestingConfig(TestCase):
     def create_app(self):
@@ -48,8 +49,12 @@ class TestProductionConfig(TestCase):
         self.assertFalse(app.config['DEBUG'])
         self.assertFalse(app.config['TESTING'])
         self.assertTrue(app.config['BCRYPT_LOG_ROUNDS'] == 13)
-        self.assertTrue(app.config['TOKEN_EXPIRATION_DAYS'] == 30)
-        self.assertTrue(app.config['TOKEN_EXPIRATION_SECONDS'] == 0)
+        self.assertTrue(app.config['SQLALCHEMY_POOL_SIZE'] == 10)
+        self.assertTrue(app.config['SQLALCHEMY_POOL_PRE_PING'])
+        self.assertTrue(app.config['SQLALCHEMY_STATEMENT_TIMEOUT_MS'] == 5000)
+        self.assertTrue(app.config['TOKEN_EXPIRATION_DAYS'] == 0)
+        self.assertTrue(app.config['TOKEN_EXPIRATION_SECONDS'] == 900)
+        self.assertTrue(app.config['REFRESH_TOKEN_EXPIRATION_DAYS'] == 30)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,46 @@
+import os, tempfile
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine.url import make_url
+
+from project import db
+from project.api.database import TimedQueuePool, dispose_engines, pool_checkout_wait, pool_exhausted
+from project.tests.base import BaseTestCase
+
+class TestDatabase(BaseTestCase):
+    def test_postgres_engine_options(self):
+        self.app.config['SQLALCHEMY_STATEMENT_TIMEOUT_MS'] = 2500
+        options = {}
+        db.apply_pool_defaults(self.app, options)
+        db.apply_driver_hacks(self.app, make_url('postgresql://postgres@localhost/users'), options)
+        self.assertIs(options['poolclass'], TimedQueuePool)
+        self.assertTrue(options['pre_ping'])
+        self.assertNotIn('pool_pre_ping', options)
+        self.assertEqual(options['pool_size'], self.app.config['SQLALCHEMY_POOL_SIZE'])
+        self.assertEqual(options['connect_args']['options'], '-c statement_timeout=2500')
+
+    def test_sqlite_engine_drops_queue_pool_options(self):
+        options = {}
+        db.apply_pool_defaults(self.app, options)
+        db.apply_driver_hacks(self.app, make_url('sqlite:////tmp/users.db'), options)
+        self.assertNotIn('pool_size', options)
+        self.assertNotIn('pre_ping', options)
+        self.assertNotIn('connect_args', options)
+
+    def test_pool_records_checkout_wait_and_exhaustion(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(
+                'sqlite:///' + os.path.join(tmp, 'pool.db'), poolclass=TimedQueuePool,
+                pool_size=1, max_overflow=0, pool_timeout=0.01, pre_ping=True
+            )
+            before = list(pool_checkout_wait.samples())
+            connection = engine.connect()
+            self.assertRaises(exc.TimeoutError, engine.connect)
+            connection.close()
+            engine.dispose()
+        self.assertNotEqual(list(pool_checkout_wait.samples()), before)
+        self.assertGreaterEqual(list(pool_exhausted.samples())[0][2], 1)
+
+    def test_dispose_engines_reconnects_lazily(self):
+        dispose_engines(self.app)
+        self.assertEqual(db.session.execute('SELECT 1').scalar(), 1)
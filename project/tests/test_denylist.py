@@ -0,0 +1,115 @@
+import datetime, json, uuid
+
+from project import db, denylist
+from project.api.denylist import BloomFilter
+from project.api.models import RevokedToken, User
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user, count_queries, login_test_user, login_user
+
+class TestBloomFilter(BaseTestCase):
+    def test_has_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        items = [uuid.uuid4().hex for _ in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for _ in range(1000):
+            bloom.add(uuid.uuid4().hex)
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+class TestTokenDenylist(BaseTestCase):
+    def test_logout_revokes_token(self):
+        add_user('test', 'test@test.com')
+        headers = login_user(self.client)
+        response = self.client.get('/auth/logout', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/auth/status', headers=headers)
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data['message'], 'Token revoked. Please log in again.')
+        self.assertEqual(RevokedToken.query.count(), 1)
+
+    def test_tokens_are_checked_without_a_query(self):
+        add_user('test', 'test@test.com')
+        headers = login_user(self.client)
+        with count_queries() as statements:
+            response = self.client.get('/auth/status', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([s for s in statements if 'revoked_tokens' in s])
+
+    def test_admin_can_revoke_token(self):
+        user = add_user('test', 'test@test.com')
+        token = User.encode_auth_token(user.id).decode()
+        with self.client:
+            headers = login_test_user(self.client)
+            response = self.client.post(
+                '/auth/revoke', data=json.dumps(dict(token=token)),
+                content_type='application/json', headers=headers
+            )
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get('/auth/status', headers=dict(Authorization='Bearer ' + token))
+            self.assertEqual(response.status_code, 401)
+
+    def test_revoke_requires_admin(self):
+        add_user('test', 'test@test.com')
+        headers = login_user(self.client)
+        token = headers['Authorization'].split(' ')[1]
+        response = self.client.post(
+            '/auth/revoke', data=json.dumps(dict(token=token)),
+            content_type='application/json', headers=headers
+        )
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data['message'], 'You do not have permission to do that.')
+
+    def test_revoke_invalid_token(self):
+        with self.client:
+            headers = login_test_user(self.client)
+            response = self.client.post(
+                '/auth/revoke', data=json.dumps(dict(token='invalid')),
+                content_type='application/json', headers=headers
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_revoke_non_string_token(self):
+        with self.client:
+            headers = login_test_user(self.client)
+            response = self.client.post(
+                '/auth/revoke', data=json.dumps(dict(token=123)),
+                content_type='application/json', headers=headers
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.decode_auth_claims(['a']), 'Invalid token. Please log in again.')
+
+    def test_refresh_picks_up_tokens_revoked_elsewhere(self):
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+        db.session.add(RevokedToken(jti='revoked-elsewhere', expires_at=expires_at))
+        db.session.commit()
+        self.assertFalse(denylist.is_revoked('revoked-elsewhere'))
+        denylist.refresh(force=True)
+        self.assertTrue(denylist.is_revoked('revoked-elsewhere'))
+
+    def test_expired_entries_are_pruned(self):
+        now = datetime.datetime.utcnow()
+        denylist.revoke('expired', now - datetime.timedelta(seconds=1))
+        denylist.revoke('current', now + datetime.timedelta(minutes=5))
+        denylist.refresh(force=True)
+        self.assertEqual([token.jti for token in RevokedToken.query.all()], ['current'])
+        self.assertNotIn('expired', denylist.filter)
+        self.assertTrue(denylist.is_revoked('current'))
+
+    def test_refresh_picks_up_ids_committed_out_of_order(self):
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+        # id 6 commits first; id 5 only becomes visible after a refresh.
+        db.session.add(RevokedToken(id=6, jti='committed-first', expires_at=expires_at))
+        db.session.commit()
+        denylist.refresh(force=True)
+        db.session.add(RevokedToken(id=5, jti='committed-second', expires_at=expires_at))
+        db.session.commit()
+        denylist._refresh_at = 0
+        denylist.refresh()
+        self.assertTrue(denylist.is_revoked('committed-second'))
@@ -0,0 +1,68 @@
+import json
+
+from project.api.diagnostics import statement_shape
+from project.api.models import User
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user, login_test_user, query_budget
+
+class TestSQLDiagnostics(BaseTestCase):
+    def test_statement_shape_ignores_literals(self):
+        self.assertEqual(
+            statement_shape("SELECT * FROM users WHERE id = 1 AND email = 'a''b'"),
+            statement_shape("SELECT *\n FROM users WHERE id = 22 AND email = 'c'")
+        )
+
+    def test_slow_queries_are_logged(self):
+        self.app.config['SQL_DIAGNOSTICS'] = True
+        self.app.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.client.get('/users')
+        self.assertIn('Slow query', logs.output[0])
+        self.assertIn('GET users.get_all_users', logs.output[0])
+
+    def test_slow_query_log_keeps_secrets_out(self):
+        self.app.config['SQL_DIAGNOSTICS'] = True
+        self.app.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            user = add_user('juneau', 'juneau@dog.com')
+        insert = next(line for line in logs.output if 'INSERT INTO users' in line)
+        self.assertIn("'password'", insert)
+        self.assertNotIn('juneau@dog.com', insert)
+        self.assertNotIn(user.password, '\n'.join(logs.output))
+        self.app.config['SLOW_QUERY_LOG_VALUES'] = True
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            user = add_user('neil', 'neil@dog.com')
+        insert = next(line for line in logs.output if 'INSERT INTO users' in line)
+        self.assertIn("'password': '<redacted>'", insert)
+        self.assertIn("'neil@dog.com'", insert)
+        self.assertNotIn(user.password, '\n'.join(logs.output))
+
+    def test_repeated_queries_are_flagged(self):
+        self.app.config['SQL_DIAGNOSTICS'] = True
+        self.app.config['SLOW_QUERY_THRESHOLD_MS'] = 10000
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            with self.app.test_request_context('/users'):
+                self.app.preprocess_request()
+                for user_id in (1, 2, 3):
+                    User.query.filter_by(id=user_id).first()
+                self.app.process_response(self.app.response_class())
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Possible N+1: GET users.get_all_users ran the same query 3 times', logs.output[0])
+
+    def test_query_budget_fails_over_budget_tests(self):
+        @query_budget(0)
+        def over_budget(test):
+            test.client.get('/users')
+        self.assertRaises(AssertionError, over_budget, self)
+
+    @query_budget(2)
+    def test_add_user_within_budget(self):
+        with self.client:
+            auth_header = login_test_user(self.client)
+            response = self.client.post(
+                '/users',
+                data=json.dumps(dict(username='neil', email='neil@test.com', password='password123')),
+                content_type='application/json',
+                headers=auth_header
+            )
+            self.assertEqual(response.status_code, 201)
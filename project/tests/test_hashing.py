@@ -0,0 +1,91 @@
+import json, threading
+from flask import Flask
+
+from project import hasher
+from project.api.hashing import HashingService, HashingUnavailable
+from project.tests.base import BaseTestCase
+
+class TestHashingService(BaseTestCase):
+    def saturate(self, service):
+        release = threading.Event()
+        futures = []
+        while True:
+            try:
+                futures.append(service.submit(release.wait, 5))
+            except HashingUnavailable:
+                return release, futures
+
+    def test_hash_and_verify(self):
+        pw_hash = hasher.hash_password('password123')
+        self.assertTrue(hasher.verify_password(pw_hash, 'password123'))
+        self.assertFalse(hasher.verify_password(pw_hash, 'password124'))
+
+    def test_empty_password_is_rejected(self):
+        self.assertRaises(ValueError, hasher.hash_password, '')
+
+    def test_saturated_pool_fails_fast(self):
+        pool_app = Flask(__name__)
+        pool_app.config.update(HASHING_POOL_WORKERS=1, HASHING_POOL_QUEUE_SIZE=1)
+        service = HashingService(pool_app)
+        release, futures = self.saturate(service)
+        self.assertEqual(len(futures), 2)
+        stats = service.stats()
+        self.assertEqual(stats['in_flight'], 2)
+        self.assertEqual(stats['queue_depth'], 1)
+        self.assertEqual(stats['rejected'], 1)
+        release.set()
+        for future in futures:
+            future.result(5)
+        stats = service.stats()
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertEqual(stats['completed'], 2)
+        self.assertGreater(stats['wait_seconds_max'], 0)
+
+    def test_map_keeps_at_most_workers_in_flight(self):
+        pool_app = Flask(__name__)
+        pool_app.config.update(HASHING_POOL_WORKERS=2, HASHING_POOL_QUEUE_SIZE=0)
+        service = HashingService(pool_app)
+        in_flight = []
+        def square(n):
+            in_flight.append(service.stats()['in_flight'])
+            return n * n
+        self.assertEqual(list(service.map(square, range(10))), [n * n for n in range(10)])
+        self.assertLessEqual(max(in_flight), 2)
+        self.assertEqual(service.stats()['rejected'], 0)
+
+    def test_registration_returns_503_when_saturated(self):
+        release, futures = self.saturate(hasher)
+        try:
+            with self.client:
+                response = self.client.post(
+                    '/auth/register',
+                    data=json.dumps(dict(username='juneau', email='juneau@dog.com', password='password123')),
+                    content_type='application/json'
+                )
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response.headers['Retry-After'], '1')
+                self.assertIn('Service busy', data['message'])
+        finally:
+            release.set()
+            for future in futures:
+                future.result(5)
+
+    def test_registration_returns_503_when_hashing_times_out(self):
+        release = threading.Event()
+        futures = [hasher.submit(release.wait, 5) for _ in range(hasher.workers)]
+        timeout, hasher.timeout = hasher.timeout, 0.01
+        try:
+            with self.client:
+                response = self.client.post(
+                    '/auth/register',
+                    data=json.dumps(dict(username='juneau', email='juneau@dog.com', password='password123')),
+                    content_type='application/json'
+                )
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response.headers['Retry-After'], '1')
+        finally:
+            hasher.timeout = timeout
+            release.set()
+            for future in futures:
+                future.result(5)
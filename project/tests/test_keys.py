@@ -0,0 +1,90 @@
+import base64, hashlib, hmac, json, os, shutil, tempfile
+
+import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from project.api.models import User
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+def write_key(key_dir, kid):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    with open(os.path.join(key_dir, kid + '.pem'), 'wb') as f:
+        f.write(pem)
+
+class TestSigningKeys(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.key_dir = tempfile.mkdtemp()
+        write_key(cls.key_dir, 'k1')
+        write_key(cls.key_dir, 'k2')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.key_dir)
+
+    def setUp(self):
+        super().setUp()
+        self.app.config.update(JWT_ALGORITHM='RS256', JWT_KEY_DIR=self.key_dir, JWT_SIGNING_KID='k1')
+
+    def test_tokens_are_signed_with_the_current_kid(self):
+        token = User.encode_auth_token(7)
+        self.assertEqual(jwt.get_unverified_header(token), {'alg': 'RS256', 'kid': 'k1', 'typ': 'JWT'})
+        self.assertEqual(User.decode_auth_token(token), 7)
+
+    def test_rotated_keys_keep_verifying(self):
+        old_token = User.encode_auth_token(7)
+        self.app.config['JWT_SIGNING_KID'] = 'k2'
+        new_token = User.encode_auth_token(7)
+        self.assertEqual(jwt.get_unverified_header(new_token)['kid'], 'k2')
+        self.assertEqual(User.decode_auth_token(old_token), 7)
+        self.assertEqual(User.decode_auth_token(new_token), 7)
+
+    def test_retired_kid_is_rejected(self):
+        token = User.encode_auth_token(7)
+        with tempfile.TemporaryDirectory() as key_dir:
+            shutil.copy(os.path.join(self.key_dir, 'k2.pem'), key_dir)
+            self.app.config.update(JWT_KEY_DIR=key_dir, JWT_SIGNING_KID='k2')
+            self.assertEqual(User.decode_auth_token(token), 'Invalid token. Please log in again.')
+
+    def test_public_key_is_not_accepted_as_hmac_secret(self):
+        with open(os.path.join(self.key_dir, 'k1.pem'), 'rb') as f:
+            public_pem = serialization.load_pem_private_key(f.read(), None, default_backend()) \
+                .public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+        def b64(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=')
+        signing_input = b64({'alg': 'HS256', 'kid': 'k1', 'typ': 'JWT'}) + b'.' + b64({'sub': 7, 'exp': 2 ** 31})
+        signature = hmac.new(public_pem, signing_input, hashlib.sha256).digest()
+        forged = signing_input + b'.' + base64.urlsafe_b64encode(signature).rstrip(b'=')
+        self.assertEqual(User.decode_auth_token(forged), 'Invalid token. Please log in again.')
+
+    def test_jwks_serves_public_keys(self):
+        response = self.client.get('/auth/jwks')
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual([key['kid'] for key in data['keys']], ['k1', 'k2'])
+        for key in data['keys']:
+            self.assertEqual((key['kty'], key['alg'], key['use']), ('RSA', 'RS256', 'sig'))
+            self.assertNotIn('d', key)
+
+    def test_jwks_verifies_tokens_locally(self):
+        token = User.encode_auth_token(7)
+        jwk = json.loads(self.client.get('/auth/jwks').data.decode())['keys'][0]
+        public_key = jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(jwk))
+        self.assertEqual(jwt.decode(token, public_key, algorithms=['RS256'])['sub'], 7)
+
+    def test_status_with_rs256_token(self):
+        user = add_user('test', 'test@test.com', 'test')
+        token = User.encode_auth_token(user.id).decode()
+        response = self.client.get('/auth/status', headers=dict(Authorization='Bearer ' + token))
+        self.assertEqual(response.status_code, 200)
+
+    def test_hs256_has_no_public_keys(self):
+        self.app.config['JWT_ALGORITHM'] = 'HS256'
+        response = self.client.get('/auth/jwks')
+        self.assertEqual(json.loads(response.data.decode()), {'keys': []})
@@ -0,0 +1,70 @@
+import json
+from unittest import mock
+
+from project.api.metrics import Counter, Histogram, Registry
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+def sample(body, series):
+    for line in body.splitlines():
+        if line.startswith(series + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0
+
+class TestMetrics(BaseTestCase):
+    def test_render_exposition_format(self):
+        registry = Registry()
+        counter = registry.register(Counter('requests_total', 'Requests.', ('path',)))
+        histogram = registry.register(Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1)))
+        counter.inc(path='/a"b')
+        histogram.observe(0.05)
+        histogram.observe(5)
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP requests_total Requests.',
+            '# TYPE requests_total counter',
+            'requests_total{path="/a\\"b"} 1',
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 1',
+            'latency_seconds_bucket{le="+Inf"} 2',
+            'latency_seconds_sum 5.05',
+            'latency_seconds_count 2',
+        ]) + '\n')
+
+    def test_metrics_endpoint_reports_request_costs(self):
+        add_user('test', 'test@test.com', 'test')
+        with self.client:
+            self.client.post(
+                '/auth/login',
+                data=json.dumps(dict(email='test@test.com', password='test')),
+                content_type='application/json'
+            )
+            response = self.client.get('/metrics')
+            body = response.data.decode()
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.content_type.startswith('text/plain'))
+            self.assertIn('http_requests_total{endpoint="auth.login_user",method="POST",status="200"}', body)
+            self.assertIn('http_request_sql_queries_bucket{endpoint="auth.login_user",method="POST",le="1"}', body)
+            self.assertIn('http_request_password_hashing_seconds_count{endpoint="auth.login_user",method="POST"}', body)
+            self.assertIn('http_request_jwt_seconds_count{endpoint="auth.login_user",method="POST"}', body)
+            self.assertIn('password_hashing_pool_queue_depth 0', body)
+
+    def test_unhandled_errors_are_counted(self):
+        errors = 'http_requests_total{endpoint="auth.introspect",method="POST",status="500"}'
+        timed = 'http_request_duration_seconds_count{endpoint="auth.introspect",method="POST"}'
+        before = self.client.get('/metrics').data.decode()
+        self.app.config['PROPAGATE_EXCEPTIONS'] = False
+        try:
+            with mock.patch('project.api.auth.load_principals', side_effect=RuntimeError):
+                response = self.client.post(
+                    '/auth/introspect',
+                    data=json.dumps(dict(tokens=[])),
+                    content_type='application/json'
+                )
+        finally:
+            self.app.config['PROPAGATE_EXCEPTIONS'] = None
+        after = self.client.get('/metrics').data.decode()
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(sample(after, errors) - sample(before, errors), 1)
+        self.assertEqual(sample(after, timed) - sample(before, timed), 1)
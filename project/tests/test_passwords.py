@@ -0,0 +1,45 @@
+import hashlib, json, unittest
+
+from project import hasher
+from project.api.models import User
+from project.api.passwords import BcryptScheme, ScryptScheme, identify
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+class TestPasswordSchemes(BaseTestCase):
+    def test_identify_bcrypt_cost(self):
+        pw_hash = BcryptScheme(rounds=5).hash('password123')
+        self.assertEqual(identify(pw_hash), BcryptScheme(rounds=5))
+        self.assertNotEqual(identify(pw_hash), BcryptScheme(rounds=4))
+
+    def test_identify_unknown_hash(self):
+        self.assertRaises(ValueError, identify, 'plaintext')
+
+    @unittest.skipUnless(hasattr(hashlib, 'scrypt'), 'hashlib.scrypt is not available')
+    def test_scrypt_hash_and_verify(self):
+        scheme = ScryptScheme(log_n=10, r=8, p=1)
+        pw_hash = scheme.hash('password123')
+        self.assertTrue(pw_hash.startswith('$scrypt$ln=10,r=8,p=1$'))
+        self.assertEqual(identify(pw_hash), scheme)
+        self.assertTrue(scheme.verify(pw_hash, 'password123'))
+        self.assertFalse(scheme.verify(pw_hash, 'password124'))
+
+    def test_needs_rehash_follows_config(self):
+        pw_hash = hasher.hash_password('password123')
+        self.assertFalse(hasher.needs_rehash(pw_hash))
+        self.app.config['BCRYPT_LOG_ROUNDS'] = 5
+        self.assertTrue(hasher.needs_rehash(pw_hash))
+
+    def test_login_upgrades_hash_cost(self):
+        add_user('test', 'test@test.com', 'test')
+        self.app.config['BCRYPT_LOG_ROUNDS'] = 5
+        with self.client:
+            response = self.client.post(
+                '/auth/login',
+                data=json.dumps(dict(email='test@test.com', password='test')),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+        user = User.query.filter_by(email='test@test.com').first()
+        self.assertEqual(identify(user.password), BcryptScheme(rounds=5))
+        self.assertTrue(hasher.verify_password(user.password, 'test'))
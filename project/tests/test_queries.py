@@ -0,0 +1,42 @@
+import datetime
+
+from project import db
+from project.api.queries import get_user_public, get_users_public, list_users
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user, count_queries
+
+class TestReadModel(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        now = datetime.datetime.utcnow()
+        self.user_ids = [
+            add_user(f'user{n}', f'user{n}@test.com', created_at=now - datetime.timedelta(minutes=n)).id
+            for n in range(3)
+        ]
+        db.session.expunge_all()
+
+    def test_get_user_public(self):
+        with count_queries() as statements:
+            user = get_user_public(self.user_ids[0])
+        self.assertEqual(set(user), {'id', 'username', 'email', 'created_at', 'updated_at'})
+        self.assertEqual(user['username'], 'user0')
+        self.assertNotIn('password', statements[0])
+        self.assertIsNone(get_user_public(999))
+
+    def test_get_users_public(self):
+        users = get_users_public([self.user_ids[2], self.user_ids[0], 999])
+        self.assertEqual(sorted(users), sorted([self.user_ids[0], self.user_ids[2]]))
+        self.assertEqual(users[self.user_ids[2]]['email'], 'user2@test.com')
+
+    def test_list_users_pages_newest_first(self):
+        first = list_users(('username',), limit=2)
+        self.assertEqual([row['username'] for row in first], ['user0', 'user1'])
+        self.assertEqual(set(first[0]), {'username', 'created_at', 'id', 'updated_at'})
+        rest = list_users(('username',), limit=2, after=(first[-1]['created_at'], first[-1]['id']))
+        self.assertEqual([row['username'] for row in rest], ['user2'])
+
+    def test_reads_bypass_the_identity_map(self):
+        list_users()
+        get_user_public(self.user_ids[0])
+        get_users_public(self.user_ids)
+        self.assertEqual(len(db.session.identity_map), 0)
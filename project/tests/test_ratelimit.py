@@ -0,0 +1,94 @@
+import json
+
+from project import rate_limiter
+from project.api.ratelimit import MemoryWindows, RateLimiter
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+class TestSlidingWindow(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.limiter = RateLimiter(self.app)
+
+    def test_limit_within_a_window(self):
+        self.assertEqual([self.limiter.hit('k', 3, now=600) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(self.limiter.hit('k', 3, now=630), 60)
+        self.assertEqual(self.limiter.hit('other', 3, now=630), 0)
+
+    def test_previous_window_is_weighted(self):
+        for _ in range(4):
+            self.limiter.hit('k', 4, now=659)
+        # 45s into the next window a quarter of the previous four still count.
+        self.assertEqual(self.limiter.hit('k', 4, now=705), 0)
+        self.assertEqual(self.limiter.hit('k', 4, now=705), 0)
+        self.assertEqual(self.limiter.hit('k', 4, now=705), 0)
+        self.assertGreater(self.limiter.hit('k', 4, now=705), 0)
+        # Windows further back are forgotten.
+        self.assertEqual(self.limiter.hit('k', 4, now=900), 0)
+
+    def test_retry_after_is_when_an_attempt_fits(self):
+        for hits, limit in ((3, 2), (6, 4)):
+            def throttled():
+                limiter = RateLimiter(self.app)
+                for _ in range(hits):
+                    limiter.hit('k', limit, now=600)
+                return limiter, limiter.hit('k', limit, now=610)
+            limiter, retry_after = throttled()
+            self.assertGreater(limiter.hit('k', limit, now=610 + retry_after - 1), 0)
+            limiter, retry_after = throttled()
+            self.assertEqual(limiter.hit('k', limit, now=610 + retry_after), 0)
+
+    def test_least_recently_hit_keys_are_evicted(self):
+        backend = MemoryWindows(maxsize=2)
+        for key in ('a', 'b', 'a', 'c'):
+            backend.incr(key, 1, 120)
+        self.assertEqual(len(backend), 2)
+        self.assertEqual(backend.incr('a', 1, 120), (3, 0))
+        self.assertEqual(backend.incr('b', 1, 120), (1, 0))
+
+class TestAuthRateLimits(BaseTestCase):
+    def post(self, url, **payload):
+        return self.client.post(url, data=json.dumps(payload), content_type='application/json')
+
+    def test_login_is_limited_per_email_before_any_query(self):
+        self.app.config['LOGIN_RATE_LIMIT_PER_EMAIL'] = 2
+        add_user('test', 'test@test.com')
+        for _ in range(2):
+            self.post('/auth/login', email='test@test.com', password='wrong')
+        with self.assertNumQueries(0):
+            response = self.post('/auth/login', email='TEST@test.com', password='password123')
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(data['message'], 'Too many attempts. Please try again later.')
+        self.assertGreater(int(response.headers['Retry-After']), 0)
+        response = self.post('/auth/login', email='other@test.com', password='password123')
+        self.assertEqual(response.status_code, 404)
+
+    def test_login_is_limited_per_ip(self):
+        self.app.config['LOGIN_RATE_LIMIT_PER_IP'] = 3
+        for n in range(3):
+            self.assertEqual(self.post('/auth/login', email=f'{n}@test.com', password='x').status_code, 404)
+        self.assertEqual(self.post('/auth/login', email='3@test.com', password='x').status_code, 429)
+        environ = {'REMOTE_ADDR': '10.0.0.2'}
+        response = self.client.post('/auth/login', data=json.dumps(dict(email='3@test.com', password='x')),
+                                    content_type='application/json', environ_base=environ)
+        self.assertEqual(response.status_code, 404)
+
+    def test_register_is_limited(self):
+        self.app.config['REGISTER_RATE_LIMIT_PER_IP'] = 1
+        response = self.post('/auth/register', username='one', email='one@test.com', password='password123')
+        self.assertEqual(response.status_code, 201)
+        with self.assertNumQueries(0):
+            response = self.post('/auth/register', username='two', email='two@test.com', password='password123')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_rejections_are_counted(self):
+        self.app.config['REGISTER_RATE_LIMIT_PER_IP'] = 0
+        before = rate_limiter.stats()['rejected']
+        self.post('/auth/register', username='one', email='one@test.com', password='password123')
+        self.assertEqual(rate_limiter.stats()['rejected'], before + 1)
+
+    def test_limits_can_be_disabled(self):
+        self.app.config.update(RATE_LIMIT_ENABLED=False, LOGIN_RATE_LIMIT_PER_IP=0)
+        self.assertEqual(self.post('/auth/login', email='a@test.com', password='x').status_code, 404)
@@ -0,0 +1,100 @@
+import datetime, json, os, tempfile
+
+from flask import g
+from project import db, principals
+from project.api.database import ReplicaRouter
+from project.api.models import User
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user
+
+class TestReplicaRouting(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.use_replicas(replica_0='sqlite:///' + os.path.join(self.tmp.name, 'replica.db'))
+        self.replica = db.get_engine(self.app, 'replica_0')
+        db.Model.metadata.create_all(bind=self.replica)
+        # Also restarts the round robin at replica_0.
+        db.router.restore()
+        db.router.writers.clear()
+
+    def tearDown(self):
+        for bind in self.app.config['SQLALCHEMY_BINDS']:
+            db.get_engine(self.app, bind).dispose()
+        self.use_replicas()
+        super().tearDown()
+        self.tmp.cleanup()
+
+    def use_replicas(self, **binds):
+        self.app.config['SQLALCHEMY_BINDS'] = binds
+        self.app.config['SQLALCHEMY_REPLICA_BINDS'] = sorted(binds)
+
+    def add_replica_user(self, username):
+        self.replica.execute(User.__table__.insert(), dict(
+            username=username, email=f'{username}@replica.com', password='x',
+            active=True, admin=False, created_at=datetime.datetime.utcnow()
+        ))
+
+    def test_list_users_reads_from_replica(self):
+        add_user('primary', 'primary@test.com')
+        self.add_replica_user('replicated')
+        response = self.client.get('/users')
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['username'] for user in data['data']['users']], ['replicated'])
+
+    def test_writes_go_to_primary(self):
+        with self.app.test_request_context():
+            with db.read_replica():
+                add_user('primary', 'primary@test.com')
+        self.assertEqual(User.query.count(), 1)
+        self.assertEqual(self.replica.execute('SELECT count(*) FROM users').scalar(), 0)
+
+    def test_registration_then_status_reads_own_writes(self):
+        response = self.client.post(
+            '/auth/register',
+            data=json.dumps(dict(username='juneau', email='juneau@dog.com', password='password123')),
+            content_type='application/json'
+        )
+        token = json.loads(response.data.decode())['auth_token']
+        response = self.client.get('/auth/status', headers=dict(Authorization='Bearer ' + token))
+        data = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['data']['username'], 'juneau')
+
+    def test_authenticate_falls_back_to_primary_for_unreplicated_user(self):
+        user = add_user('juneau', 'juneau@dog.com')
+        token = User.encode_auth_token(user.id).decode()
+        db.router.writers.clear()
+        principals.clear()
+        response = self.client.get('/auth/status', headers=dict(Authorization='Bearer ' + token))
+        self.assertEqual(response.status_code, 200)
+
+    def test_failed_replica_is_ejected_and_read_retried_on_primary(self):
+        self.use_replicas(replica_0=self.app.config['SQLALCHEMY_BINDS']['replica_0'],
+                          replica_1='sqlite:///' + os.path.join(self.tmp.name, 'missing', 'replica.db'))
+        user = add_user('juneau', 'juneau@dog.com')
+        self.add_replica_user('juneau')
+        response = self.client.get(f'/users/{user.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(g.replica_bind, 'replica_0')
+        # Each request picks its own replica: the next one in turn is replica_1.
+        del g.replica_bind
+        response = self.client.get(f'/users/{user.id}')
+        self.assertEqual(response.status_code, 200)
+        # replica_1 failed and the read was retried on the primary.
+        self.assertIsNone(g.replica_bind)
+        self.assertEqual(db.router.choose(['replica_1']), None)
+        self.assertEqual(db.router.choose(['replica_0', 'replica_1']), 'replica_0')
+
+    def test_round_robin_skips_ejected_replicas(self):
+        router = ReplicaRouter()
+        binds = ['replica_0', 'replica_1']
+        self.assertEqual([router.choose(binds) for _ in range(4)],
+                         ['replica_0', 'replica_1', 'replica_0', 'replica_1'])
+        router.eject('replica_1', 30)
+        self.assertEqual([router.choose(binds) for _ in range(2)], ['replica_0', 'replica_0'])
+        router.eject('replica_0', 30)
+        self.assertIsNone(router.choose(binds))
+        router.restore()
+        self.assertIn(router.choose(binds), binds)
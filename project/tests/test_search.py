@@ -0,0 +1,70 @@
+import json
+
+from project import db
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user, login_test_user, login_user, query_budget
+
+class TestUserSearch(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.headers = login_test_user(self.client)
+        add_user('Alice', 'alice@example.com')
+        add_user('alfred', 'fred@example.com')
+        add_user('bob', 'albert@example.com')
+        add_user('al_ice', 'other@example.com')
+
+    def search(self, query):
+        response = self.client.get('/users/search?' + query, headers=self.headers)
+        return response, json.loads(response.data.decode())
+
+    @query_budget(2)  # loading the admin, then the search itself
+    def test_prefix_matches_username_or_email_ignoring_case(self):
+        response, data = self.search('q=AL')
+        self.assertEqual(response.status_code, 200)
+        # Ordered by the matched username, or the email when only it matched,
+        # compared byte-wise on every database.
+        self.assertEqual([user['username'] for user in data['data']['users']], ['al_ice', 'bob', 'alfred', 'Alice'])
+        self.assertEqual(set(data['data']['users'][0]), {'id', 'username', 'email', 'created_at'})
+        self.assertIsNone(data['data']['next_cursor'])
+
+    def test_like_wildcards_are_literal(self):
+        _, data = self.search('q=al_')
+        self.assertEqual([user['username'] for user in data['data']['users']], ['al_ice'])
+        _, data = self.search('q=%25')
+        self.assertEqual(data['data']['users'], [])
+
+    def test_results_are_keyset_paginated(self):
+        usernames, cursor = [], ''
+        while True:
+            _, data = self.search(f'q=al&limit=3&cursor={cursor}')
+            usernames += [user['username'] for user in data['data']['users']]
+            cursor = data['data']['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(usernames, ['al_ice', 'bob', 'alfred', 'Alice'])
+
+    def test_fuzzy_matches_substrings(self):
+        _, data = self.search('q=FRED&fuzzy=true')
+        usernames = [user['username'] for user in data['data']['users']]
+        if db.engine.dialect.name == 'postgresql':
+            # Ranked by trigram similarity, which may admit near misses.
+            self.assertEqual(usernames[0], 'alfred')
+        else:
+            self.assertEqual(usernames, ['alfred'])
+        self.assertIsNone(data['data']['next_cursor'])
+
+    def test_fuzzy_needs_three_characters(self):
+        response, data = self.search('q=fr&fuzzy=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['message'], 'Fuzzy search needs at least 3 characters')
+
+    def test_invalid_parameters(self):
+        for query in ('q=', 'q=al&limit=0', 'q=al&cursor=invalid', 'q=ali&fuzzy=1&cursor=abc'):
+            response, data = self.search(query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(data['message'], 'Invalid query parameters')
+
+    def test_search_requires_admin(self):
+        add_user('test', 'test@test.com')
+        response = self.client.get('/users/search?q=al', headers=login_user(self.client))
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,69 @@
+import datetime, gzip, json, zlib
+
+from project.api.serialization import ENCODERS, get_encoder, register_encoder
+from project.tests.base import BaseTestCase
+from project.tests.utils import add_user, login_test_user
+
+class TestEncoders(BaseTestCase):
+    def test_datetimes_are_iso_8601(self):
+        value = {'created_at': datetime.datetime(2017, 9, 5, 8, 0, 23, 495420)}
+        for name in ENCODERS:
+            self.assertEqual(json.loads(get_encoder(name)(value).decode()),
+                             {'created_at': '2017-09-05T08:00:23.495420Z'}, name)
+
+    def test_routes_use_iso_8601(self):
+        user = add_user('neilb', 'neilb14@mailinator.com', created_at=datetime.datetime(2017, 9, 5, 8, 0, 23))
+        response = self.client.get(f'/users/{user.id}')
+        self.assertEqual(json.loads(response.data.decode())['data']['created_at'], '2017-09-05T08:00:23Z')
+
+    def test_auto_falls_back_to_stdlib(self):
+        self.assertIn(get_encoder('auto'), ENCODERS.values())
+        self.assertIs(get_encoder('json'), ENCODERS['json'])
+        self.assertRaises(ValueError, get_encoder, 'missing')
+
+    def test_registered_encoder_is_used(self):
+        register_encoder('test', lambda obj: b'{"encoded":"test"}')
+        self.app.config['JSON_ENCODER'] = 'test'
+        try:
+            response = self.client.get('/users')
+        finally:
+            del ENCODERS['test']
+        self.assertEqual(json.loads(response.data.decode()), {'encoded': 'test'})
+
+class TestCompression(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['COMPRESS_MIN_SIZE'] = 200
+        for n in range(5):
+            add_user(f'user{n}', f'user{n}@test.com')
+
+    def test_gzip_and_deflate_are_negotiated(self):
+        plain = self.client.get('/users')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        for encoding, decompress in (('gzip', gzip.decompress), ('deflate', zlib.decompress)):
+            response = self.client.get('/users', headers={'Accept-Encoding': encoding})
+            self.assertEqual(response.headers['Content-Encoding'], encoding)
+            self.assertEqual(decompress(response.data), plain.data)
+            self.assertEqual(response.headers['ETag'], plain.headers['ETag'][:-1] + f'-{encoding}"')
+
+    def test_small_responses_are_not_compressed(self):
+        self.app.config['COMPRESS_MIN_SIZE'] = 100000
+        response = self.client.get('/users', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_compressed_etag_revalidates(self):
+        response = self.client.get('/users', headers={'Accept-Encoding': 'gzip'})
+        response = self.client.get('/users', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']
+        })
+        self.assertEqual(response.status_code, 304)
+
+    def test_streamed_export_is_not_buffered(self):
+        headers = login_test_user(self.client)
+        headers['Accept-Encoding'] = 'gzip'
+        response = self.client.get('/users/export', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn(b'user4@test.com', response.data)
@@ -1,3 +1,5 @@
+import datetime
+
 from sqlalchemy.exc import IntegrityError
 
 from project import db
@@ -53,4 +55,25 @@ class TestUserModel(BaseTestCase):
     def test_decode_auth_token(self):
         user = add_user('juneau','juneau@dog.com')
         auth_token = user.encode_auth_token(user.id)
-        self.assertEqual(User.decode_auth_token(auth_token), user.id)
\ No newline at end of file
+        self.assertEqual(User.decode_auth_token(auth_token), user.id)
+
+    def test_email_is_normalized(self):
+        user = add_user('juneau', ' Juneau@Dog.COM ')
+        self.assertEqual(user.email, 'juneau@dog.com')
+        self.assertEqual(User.find_by_email('JUNEAU@dog.com').id, user.id)
+
+    def test_mixed_case_duplicate_email_is_rejected(self):
+        add_user('juneau', 'juneau@dog.com')
+        # A raw insert bypasses normalization; the lower(email) index still holds.
+        insert = User.__table__.insert().values(
+            username='juneau123', email='JUNEAU@dog.com', password='x', created_at=datetime.datetime.utcnow())
+        self.assertRaises(IntegrityError, db.session.execute, insert)
+
+    def test_email_lookup_probes_an_index(self):
+        if db.engine.dialect.name != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite syntax')
+        statement = User.query.filter_by(email='juneau@dog.com').limit(1).statement
+        sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(str(row[-1]) for row in db.session.execute('EXPLAIN QUERY PLAN ' + sql))
+        self.assertIn('USING INDEX', plan)
+        self.assertNotIn('SCAN', plan)
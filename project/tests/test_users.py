@@ -3,7 +3,7 @@ import json,datetime
 from project import db
 from project.tests.base import BaseTestCase
 from project.api.models import User
-from project.tests.utils import add_user, login_test_user
+from project.tests.utils import add_user, login_test_user, login_user, query_budget
 
 class TestUserService(BaseTestCase):
     """Tests for the Users Service."""
@@ -26,6 +26,22 @@ class TestUserService(BaseTestCase):
             self.assertIn('neilb14@mailinator.com was added!', data['message'])
             self.assertIn('success', data['status'])
     
+    def test_add_user_loads_current_user_once(self):
+        """Ensure authentication and the admin check share one user lookup"""
+        with self.client:
+            auth_header = login_test_user(self.client)
+            with self.assertNumQueries(2):
+                response = self.client.post('/users',
+                                            data=json.dumps(dict(
+                                                username="neil",
+                                                email="neilb14@mailinator.com",
+                                                password="password123"
+                                            )),
+                                            content_type='application/json',
+                                            headers=auth_header
+                                            )
+            self.assertEqual(response.status_code, 201)
+
     def test_add_user_invalid_payload(self):
         """Ensure error when payload is empty"""
         with self.client:
@@ -74,6 +90,7 @@ class TestUserService(BaseTestCase):
             self.assertIn('User already exists', data['message'])
             self.assertIn('fail', data['status'])
 
+    @query_budget(1)
     def test_get_single_user(self):
         """Ensure we can retrieve a single user"""
         user = add_user("neilb", "neilb14@mailinator.com")
@@ -106,6 +123,7 @@ class TestUserService(BaseTestCase):
             self.assertIn('User does not exist', data['message'])
             self.assertIn('fail', data['status'])
 
+    @query_budget(1)
     def test_get_all_users(self):
         """Ensure we can get all users"""
         created_30_days_ago = datetime.datetime.utcnow() + datetime.timedelta(-30)
@@ -122,6 +140,112 @@ class TestUserService(BaseTestCase):
             self.assertIn('neilb', data['data']['users'][1]['username'])
             self.assertIn('success', data['status'])
 
+    @query_budget(1)
+    def test_get_all_users_paginated(self):
+        """Ensure the user list can be walked with a keyset cursor"""
+        created_at = datetime.datetime.utcnow()
+        add_user('neilb', 'neilb14@mailinator.com', 'password123', created_at)
+        add_user('juneau', 'juneau@mailinator.com', 'password123', created_at)
+        add_user('jersey', 'jersey@mailinator.com', 'password123', created_at - datetime.timedelta(1))
+        with self.client:
+            response = self.client.get('/users?limit=2')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([u['username'] for u in data['data']['users']], ['juneau', 'neilb'])
+            self.assertTrue(data['data']['next_cursor'])
+            response = self.client.get(f'/users?limit=2&cursor={data["data"]["next_cursor"]}')
+            data = json.loads(response.data.decode())
+            self.assertEqual([u['username'] for u in data['data']['users']], ['jersey'])
+            self.assertIsNone(data['data']['next_cursor'])
+
+    def test_get_all_users_limit_is_capped(self):
+        """Ensure limit cannot exceed the configured maximum"""
+        self.app.config['USERS_PAGE_MAX_LIMIT'] = 1
+        add_user('neilb', 'neilb14@mailinator.com')
+        add_user('juneau', 'juneau@mailinator.com')
+        with self.client:
+            response = self.client.get('/users?limit=100')
+            data = json.loads(response.data.decode())
+            self.assertEqual(len(data['data']['users']), 1)
+            self.assertTrue(data['data']['next_cursor'])
+
+    def test_get_all_users_fields(self):
+        """Ensure only the requested fields are returned"""
+        add_user('neilb', 'neilb14@mailinator.com')
+        with self.client:
+            response = self.client.get('/users?fields=username')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(data['data']['users'], [{'username': 'neilb'}])
+
+    def test_get_all_users_invalid_parameters(self):
+        """Ensure bad paging and projection parameters are rejected"""
+        with self.client:
+            for query in ('limit=0', 'limit=blah', 'cursor=blah', 'fields=password'):
+                response = self.client.get(f'/users?{query}')
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Invalid query parameters', data['message'])
+                self.assertIn('fail', data['status'])
+
+    def test_get_users_by_ids(self):
+        """Ensure a batch of users is fetched in request order with one query"""
+        first = add_user('neilb', 'neilb14@mailinator.com').id
+        second = add_user('juneau', 'juneau@mailinator.com').id
+        with self.client:
+            with self.assertNumQueries(1):
+                response = self.client.get(f'/users?ids={second},999,{first},{second}')
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([user['username'] for user in data['data']['users']], ['juneau', 'neilb'])
+            self.assertEqual(data['data']['missing'], [999])
+            single = json.loads(self.client.get(f'/users/{first}').data.decode())
+            self.assertEqual(data['data']['users'][1], single['data'])
+
+    def test_get_users_by_ids_invalid(self):
+        """Ensure malformed or oversized id lists are rejected"""
+        with self.client:
+            too_many = ','.join(str(n) for n in range(self.app.config['USERS_BATCH_MAX_IDS'] + 1))
+            for ids in ('1,blah', too_many):
+                response = self.client.get(f'/users?ids={ids}')
+                data = json.loads(response.data.decode())
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('fail', data['status'])
+
+    def test_get_single_user_conditional(self):
+        """Ensure a client holding the current representation gets a 304"""
+        user = add_user('neilb', 'neilb14@mailinator.com')
+        user_id = user.id
+        with self.client:
+            response = self.client.get(f'/users/{user_id}')
+            etag = response.headers['ETag']
+            last_modified = response.headers['Last-Modified']
+            self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+            response = self.client.get(f'/users/{user_id}', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b'')
+            self.assertEqual(response.headers['ETag'], etag)
+            response = self.client.get(f'/users/{user_id}', headers={'If-Modified-Since': last_modified})
+            self.assertEqual(response.status_code, 304)
+            user.username = 'neil'
+            db.session.commit()
+            response = self.client.get(f'/users/{user_id}', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_get_all_users_conditional(self):
+        """Ensure an unchanged page gets a 304 and a changed one does not"""
+        add_user('neilb', 'neilb14@mailinator.com')
+        with self.client:
+            etag = self.client.get('/users').headers['ETag']
+            response = self.client.get('/users', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get('/users?fields=username', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            add_user('juneau', 'juneau@mailinator.com')
+            response = self.client.get('/users', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+
     def test_add_users_invalid_json_keys_no_password(self):
         """Ensure we get an error when no password passed in"""
         with self.client:
@@ -170,3 +294,47 @@ class TestUserService(BaseTestCase):
             self.assertTrue(
                 data['message'] == 'Something went wrong. Please contact us.')
             self.assertEqual(response.status_code, 401)
+
+    def test_export_users_ndjson(self):
+        """Ensure admins can stream all users as NDJSON"""
+        add_user('neilb', 'neilb14@mailinator.com')
+        # Streamed responses keep their request context until fully read,
+        # so these requests are made outside a preserved client context.
+        auth_header = login_test_user(self.client)
+        response = self.client.get('/users/export?format=ndjson', headers=auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['neilb', 'test_user'])
+        self.assertNotIn('password', rows[0])
+        self.assertTrue(rows[1]['admin'])
+
+    def test_export_users_csv(self):
+        """Ensure admins can stream all users as CSV"""
+        add_user('neilb', 'neilb14@mailinator.com')
+        auth_header = login_test_user(self.client)
+        response = self.client.get('/users/export?format=csv', headers=auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        lines = response.data.decode().splitlines()
+        self.assertEqual(lines[0], 'id,username,email,active,admin,created_at')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith('1,neilb,neilb14@mailinator.com,True,False,'))
+
+    def test_export_users_invalid_format(self):
+        """Ensure unknown export formats are rejected"""
+        with self.client:
+            auth_header = login_test_user(self.client)
+            response = self.client.get('/users/export?format=xml', headers=auth_header)
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Invalid export format', data['message'])
+
+    def test_export_users_not_admin(self):
+        """Ensure only admins can export users"""
+        add_user('test', 'test@test.com', 'test')
+        with self.client:
+            response = self.client.get('/users/export', headers=login_user(self.client, password='test'))
+            data = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 401)
+            self.assertIn('You do not have permission to do that.', data['message'])
@@ -1,7 +1,10 @@
 import datetime, json
+from contextlib import contextmanager
+from functools import wraps
 from flask import request
+from sqlalchemy import event
 
-from project import db
+from project import db, sql_diagnostics
 from project.api.models import User
 
 def add_user(username, email, password='password123', created_at=datetime.datetime.utcnow()):
@@ -19,3 +22,42 @@ def login_test_user(client):
                 content_type='application/json'
         )
         return dict(Authorization='Bearer ' + json.loads(resp_login.data.decode())['auth_token'])
+
+def login_user(client, email='test@test.com', password='password123'):
+        """Logs in through the API and returns the Authorization header."""
+        resp_login = client.post('/auth/login',
+                data=json.dumps(dict(email=email, password=password)),
+                content_type='application/json'
+        )
+        return dict(Authorization='Bearer ' + json.loads(resp_login.data.decode())['auth_token'])
+
+@contextmanager
+def count_queries():
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+                yield statements
+        finally:
+                event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+def query_budget(num):
+        """Fails the decorated test if any request it makes runs more than num
+        SQL statements."""
+        def decorator(test):
+                @wraps(test)
+                def wrapper(self, *args, **kwargs):
+                        over_budget = []
+                        def check(route, statements):
+                                if len(statements) > num:
+                                        over_budget.append((route, statements))
+                        sql_diagnostics.observers.append(check)
+                        try:
+                                test(self, *args, **kwargs)
+                        finally:
+                                sql_diagnostics.observers.remove(check)
+                        for route, statements in over_budget:
+                                self.fail(f'{route} ran {len(statements)} queries, budget is {num}:\n' + '\n'.join(statements))
+                return wrapper
+        return decorator